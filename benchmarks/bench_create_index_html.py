@@ -0,0 +1,62 @@
+"""
+Compares finding the artifacts of every volume of a reporter with a substring scan over the reporter's files, as
+create_artifacts_html used to, against a single pass building an artifact index
+
+Run with `python benchmarks/bench_create_index_html.py [volume count] [files per volume]`
+"""
+import sys
+import time
+
+sys.path.insert(0, ".")
+
+from tasks.create_index_html import create_artifact_index, create_artifacts_html  # noqa: E402
+
+
+def make_reporter_items(volume_count, files_per_volume):
+    """
+    Makes the listing of a synthetic reporter: per volume a zip, a pdf and tar artifacts, and its case files
+    """
+    items = []
+    for volume in range(1, volume_count + 1):
+        for ext in ["zip", "pdf", "tar", "tar.csv", "tar.sha256"]:
+            items.append({"Key": f"r/{volume}.{ext}", "Size": 1024})
+        for case in range(files_per_volume):
+            items.append({"Key": f"r/{volume}/cases/{case:04d}-01.json", "Size": 1024})
+    return items
+
+
+def render_with_substring_scan(items, volumes):
+    reporter_files = [item["Key"] for item in items]
+    html = ""
+    for volume in volumes:
+        for ext in ["pdf", "tar", "tar.csv", "tar.sha256"]:
+            file_name = f"r/{volume}.{ext}"
+            if any(file_name in file for file in reporter_files):
+                html += f"<td><a href='{file_name}'>{volume}.{ext}</a></td>"
+            else:
+                html += "<td></td>"
+    return html
+
+
+def render_with_index(items, volumes):
+    reporter_artifacts = create_artifact_index(items, "r")
+    return "".join(create_artifacts_html(reporter_artifacts, "r", volume) for volume in volumes)
+
+
+if __name__ == "__main__":
+    volume_count = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    files_per_volume = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    items = make_reporter_items(volume_count, files_per_volume)
+    volumes = [str(volume) for volume in range(1, volume_count + 1)]
+    print(f"{volume_count} volumes, {len(items)} files")
+
+    start = time.perf_counter()
+    render_with_substring_scan(items, volumes)
+    scan = time.perf_counter() - start
+    print(f"substring scan:   {scan:.3f}s")
+
+    start = time.perf_counter()
+    render_with_index(items, volumes)
+    indexed = time.perf_counter() - start
+    print(f"artifact index:   {indexed:.3f}s")
+    print(f"speedup: {scan / indexed:.0f}x")
@@ -0,0 +1,93 @@
+"""
+Compares listing a bucket as one sequential stream of pages against list_objects_sharded, on a fake bucket where
+every LIST request takes a fixed time, like a round trip to R2
+
+Run with `python benchmarks/bench_listing.py [reporter count] [request ms] [workers]`
+"""
+import bisect
+import random
+import sys
+import time
+
+sys.path.insert(0, ".")
+
+from tasks.helpers import list_objects_sharded  # noqa: E402
+
+
+class FakeListingClient:
+    """
+    Serves list_objects_v2 pages of up to 1000 keys from a sorted list of keys, sleeping once per page
+    """
+
+    def __init__(self, keys, latency):
+        self.keys = sorted(keys)
+        self.latency = latency
+
+    def get_paginator(self, operation_name):
+        return self
+
+    def paginate(self, Bucket, Prefix="", Delimiter=None, PaginationConfig=None):
+        contents = []
+        common_prefixes = []
+        start = bisect.bisect_left(self.keys, Prefix)
+        end = bisect.bisect_left(self.keys, Prefix + chr(0x10FFFF))
+        for key in self.keys[start:end]:
+            rest = key[len(Prefix):]
+            if Delimiter and Delimiter in rest:
+                common_prefix = Prefix + rest[:rest.index(Delimiter) + 1]
+                if not common_prefixes or common_prefixes[-1] != common_prefix:
+                    common_prefixes.append(common_prefix)
+            else:
+                contents.append({"Key": key})
+
+        results = [("Contents", item) for item in contents] + [("CommonPrefixes", {"Prefix": common_prefix})
+                                                                for common_prefix in common_prefixes]
+        for start in range(0, max(len(results), 1), 1000):
+            time.sleep(self.latency)
+            page = {"Contents": [], "CommonPrefixes": []}
+            for field, value in results[start:start + 1000]:
+                page[field].append(value)
+            yield page
+
+
+def make_keys(reporter_count):
+    """
+    Makes reporters of very different sizes, like the static bucket: a few large ones and many small ones
+    """
+    rng = random.Random(0)
+    keys = []
+    for reporter in range(reporter_count):
+        for volume in range(1, int(rng.paretovariate(1.2) * 5) + 1):
+            keys.append(f"r{reporter}/{volume}.zip")
+            keys += [f"r{reporter}/{volume}/cases/{case:04d}-01.json" for case in range(rng.randint(50, 400))]
+    return keys
+
+
+def list_sequentially(client, prefix=""):
+    return [item for page in client.paginate(Bucket="bench", Prefix=prefix) for item in page["Contents"]]
+
+
+if __name__ == "__main__":
+    reporter_count = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    latency = (int(sys.argv[2]) if len(sys.argv) > 2 else 20) / 1000
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else 16
+    client = FakeListingClient(make_keys(reporter_count), latency)
+    largest_reporter = max({key.split("/")[0] for key in client.keys},
+                           key=lambda reporter: sum(key.startswith(f"{reporter}/") for key in client.keys))
+    print(f"{len(client.keys)} keys in {reporter_count} reporters, {latency * 1000:.0f} ms per request, "
+          f"{workers} workers")
+
+    start = time.perf_counter()
+    assert len(list_sequentially(client)) == len(client.keys)
+    sequential = time.perf_counter() - start
+    print(f"sequential listing:          {sequential:.2f}s")
+
+    start = time.perf_counter()
+    list_sequentially(client, f"{largest_reporter}/")
+    print(f"largest reporter alone:      {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    assert len(list(list_objects_sharded("bench", s3_client=client, workers=workers))) == len(client.keys)
+    sharded = time.perf_counter() - start
+    print(f"sharded listing:             {sharded:.2f}s")
+    print(f"speedup: {sequential / sharded:.2f}x")
@@ -0,0 +1,66 @@
+"""
+Measures render throughput, in pages/s, of volume cases level index pages built with repeated `html +=` (as
+create_index_html used to) against the f-string fragments of create_index_html
+
+Run with `python benchmarks/bench_render_index_html.py [rows per page] [pages]`
+"""
+import re
+import sys
+import time
+
+sys.path.insert(0, ".")
+
+from tasks.create_index_html import create_volume_cases_level_html  # noqa: E402
+
+
+def make_item(row_count):
+    return {
+        "reporter": "a2d",
+        "volume": "100",
+        "file_location": "cases",
+        "key": [f"a2d/100/cases/{row:04d}-01.json" for row in range(row_count)],
+        "file_size": [f"{row % 97 + 1}.5 KB" for row in range(row_count)],
+        "last_modified": ["03/04/2024 14:51:10"] * row_count,
+    }
+
+
+def render_with_concatenation(item, base_url=""):
+    html = ("<style>table {width: 100%;}td, th {text-align: left;} th {padding-top: 5px; padding-bottom: 14px} ul {"
+            "font-size: 1.50em; font-weight: bold; padding: 0} li {display: inline;}</style>")
+    html += (f"<ul><li><a href='{base_url}'>Home</a></li><li> / </li><li><a href='{base_url}"
+             f"{item['reporter']}/'>{item['reporter']}</a></li><li> / </li><li><a href='{base_url}"
+             f"{item['reporter']}/{item['volume']}/'>{item['volume']}</a></li><li> / </li><li>{item['file_location']}"
+             f"</li></ul>")
+    html += "<table><tr><th>File</th><th>Size</th><th>Last Modified</th></tr>"
+
+    for index, key in enumerate(item["key"]):
+        file = re.split("/", key)[-1]
+        html += f"<tr><td><a href='{base_url}{key}'>{file}</a></td>"
+        html += f"<td>{item['file_size'][index]}</td>"
+        html += f"<td>{item['last_modified'][index]}</td></tr>"
+    html += "</table>"
+
+    return html
+
+
+def bench(function, item, pages, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(pages):
+            function(item)
+        best = min(best, time.perf_counter() - start)
+    return pages / best
+
+
+if __name__ == "__main__":
+    row_count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    pages = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    item = make_item(row_count)
+    print(f"{pages} pages of {row_count} rows")
+
+    concatenated = bench(render_with_concatenation, item, pages)
+    print(f"html += in loops:     {concatenated:.0f} pages/s")
+    fragments = bench(create_volume_cases_level_html, item, pages)
+    print(f"f-string fragments:   {fragments:.0f} pages/s")
+    print(f"speedup: {fragments / concatenated:.2f}x")
@@ -0,0 +1,70 @@
+"""
+Measures how fast a volume listing is converted into the size and Last Modified columns of its pages: one object at
+a time with convert_time and round (as get_volume_files used to) against the bulk conversions of create_index_html
+
+Run with `python benchmarks/bench_volume_files.py [objects] [volumes]`
+"""
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytz
+
+sys.path.insert(0, ".")
+
+from tasks.create_index_html import convert_sizes, convert_times  # noqa: E402
+
+
+def make_listing(object_count):
+    """
+    Makes the sizes and LastModified times of a synthetic listing, spread over ten years of DST transitions
+    """
+    rng = random.Random(0)
+    start = datetime(2015, 1, 1, tzinfo=timezone.utc)
+    sizes = [rng.randrange(200, 2_000_000) for _ in range(object_count)]
+    times = [start + timedelta(seconds=rng.randrange(10 * 365 * 24 * 3600)) for _ in range(object_count)]
+    return sizes, times
+
+
+def convert_time(time_obj):
+    utc_datetime = time_obj.strftime("%m/%d/%Y %H:%M:%S")
+    parsed_datetime = datetime.strptime(utc_datetime, "%m/%d/%Y %H:%M:%S")
+    localized_datetime = pytz.utc.localize(parsed_datetime)
+    est_datetime = localized_datetime.astimezone(pytz.timezone('America/New_York'))
+    return est_datetime.strftime("%m/%d/%Y %H:%M:%S")
+
+
+def convert_per_item(sizes, times):
+    return [f"{round(size / 1024, 2)} KB" for size in sizes], [convert_time(time_obj) for time_obj in times]
+
+
+def convert_in_bulk(sizes, times):
+    return convert_sizes(sizes), convert_times(times)
+
+
+def bench(function, volumes, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for sizes, times in volumes:
+            function(sizes, times)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    object_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    volume_count = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    sizes, times = make_listing(object_count)
+    per_volume = max(object_count // volume_count, 1)
+    volumes = [(sizes[start:start + per_volume], times[start:start + per_volume])
+               for start in range(0, object_count, per_volume)]
+    assert convert_per_item(sizes, times) == convert_in_bulk(sizes, times)
+    print(f"{object_count} objects in {len(volumes)} volumes")
+
+    per_item = bench(convert_per_item, volumes)
+    print(f"per item:  {per_item:.2f}s ({object_count / per_item:.0f} objects/s)")
+    bulk = bench(convert_in_bulk, volumes)
+    print(f"in bulk:   {bulk:.2f}s ({object_count / bulk:.0f} objects/s)")
+    print(f"speedup: {per_item / bulk:.2f}x")
@@ -0,0 +1,87 @@
+"""
+Compares building a volume zip with compression under the global zip lock (zipfile.writestr)
+against compressing in the fetch threads and only appending under the lock (ZipStreamWriter)
+
+Run with `python benchmarks/bench_zip_volumes.py [file count] [threads]`
+"""
+import concurrent.futures
+import io
+import json
+import random
+import sys
+import threading
+import time
+import zipfile
+
+sys.path.insert(0, ".")
+
+from tasks.helpers import ZipStreamWriter, compress_zip_entry  # noqa: E402
+
+
+def make_case_files(count):
+    """
+    Makes case json files of about 15 KB, compressible like real case text
+    """
+    rng = random.Random(0)
+    words = ["court", "appellant", "judgment", "evidence", "statute", "defendant", "plaintiff", "affirmed", "the",
+             "of", "and", "to", "in", "that", "was", "error", "trial", "jury", "motion", "opinion"]
+    files = {}
+    for number in range(count):
+        text = " ".join(rng.choice(words) for _ in range(2200))
+        files[f"json/{number:04d}-01.json"] = json.dumps({"id": number, "casebody": {"opinions": [text]}}).encode()
+    return files
+
+
+def zip_with_writestr(files, threads):
+    lock = threading.Lock()
+    bytes_io = io.BytesIO()
+
+    def write(name, content):
+        with lock:
+            zip_file.writestr(name, content)
+
+    with zipfile.ZipFile(bytes_io, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(write, files.keys(), files.values()))
+    return bytes_io.getvalue()
+
+
+def zip_with_stream_writer(files, threads):
+    lock = threading.Lock()
+    bytes_io = io.BytesIO()
+    date_time = time.localtime()[:6]
+
+    def write(name, content):
+        entry = compress_zip_entry(name, content, date_time)
+        with lock:
+            zip_file.add_entry(entry)
+
+    with ZipStreamWriter(bytes_io) as zip_file:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(write, files.keys(), files.values()))
+    return bytes_io.getvalue()
+
+
+def bench(function, files, threads, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        archive = function(files, threads)
+        best = min(best, time.perf_counter() - start)
+    with zipfile.ZipFile(io.BytesIO(archive)) as zip_ref:
+        assert zip_ref.testzip() is None
+    return best
+
+
+if __name__ == "__main__":
+    file_count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    files = make_case_files(file_count)
+    megabytes = sum(len(content) for content in files.values()) / 1e6
+    print(f"{file_count} case files, {megabytes:.1f} MB, {threads} threads")
+
+    locked = bench(zip_with_writestr, files, threads)
+    print(f"writestr under lock:      {locked:.2f}s ({megabytes / locked:.1f} MB/s)")
+    parallel = bench(zip_with_stream_writer, files, threads)
+    print(f"compress outside lock:    {parallel:.2f}s ({megabytes / parallel:.1f} MB/s)")
+    print(f"speedup: {locked / parallel:.2f}x")
@@ -5,7 +5,7 @@ from dotenv import load_dotenv
 load_dotenv()
 
 
-from tasks import zip_volumes, unredact, split_pdfs, sync_static_bucket, create_index_html
+from tasks import zip_volumes, unredact, split_pdfs, sync_static_bucket, create_index_html, inventory
 
 
 ns = Collection()
@@ -13,4 +13,5 @@ ns.add_collection(Collection.from_module(zip_volumes))
 ns.add_collection(Collection.from_module(unredact))
 ns.add_collection(Collection.from_module(split_pdfs))
 ns.add_collection(Collection.from_module(sync_static_bucket))
-ns.add_collection(Collection.from_module(create_index_html))
\ No newline at end of file
+ns.add_collection(Collection.from_module(create_index_html))
+ns.add_collection(Collection.from_module(inventory))
\ No newline at end of file
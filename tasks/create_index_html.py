@@ -1,24 +1,94 @@
+import hashlib
 import json
+import multiprocessing
+import os
+import tarfile
+import tempfile
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+import numpy as np
 import pandas as pd
 from natsort import natsorted
 from invoke import task
 from datetime import datetime
-import re
 import pytz
+from botocore.exceptions import ClientError
 
 from .helpers import (
     get_volumes_metadata,
     get_reporters_metadata,
-    get_reporter_files,
-    r2_paginator,
+    check_content_encoding,
+    encode_body,
+    is_index_file,
+    list_objects,
     r2_s3_client,
     R2_STATIC_BUCKET,
-    CAP_STATIC_BASE_URL
+    CAP_STATIC_BASE_URL,
+    INDEX_STATE_FILE,
+    MAX_POOL_CONNECTIONS,
 )
 
+# index.html uploads in flight, and processes rendering pages for render-html
+UPLOAD_WORKERS = 16
+RENDER_PROCESSES = os.cpu_count()
+
+# timezone of the Last Modified column of the volume pages
+LOCAL_TIMEZONE = "America/New_York"
+
+# volume artifacts linked from reporter pages, next to the volume zip
+ARTIFACT_EXTENSIONS = ["pdf", "tar", "tar.csv", "tar.sha256"]
+
+# fragments shared by every page
+PAGE_HEADER = ("<style>table {width: 100%;}td, th {text-align: left;} th {padding-top: 5px; padding-bottom: 14px} ul {"
+               "font-size: 1.50em; font-weight: bold; padding: 0} li {display: inline;}</style>")
+TABLE_FOOTER = "</table>"
+BREADCRUMB_SEPARATOR = "<li> / </li>"
+
+
+# page fragments, as plain f-strings so that rendering a row doesn't parse or concatenate anything
+def table_header(header_cells):
+    return f"<table><tr>{header_cells}</tr>"
+
+
+def breadcrumb(label):
+    return f"<li>{label}</li>"
+
+
+def breadcrumb_link(href, label):
+    return f"<li><a href='{href}'>{label}</a></li>"
+
+
+def link_row(href, name):
+    return f"<tr><td><a href='{href}'>{name}</a></td></tr>"
+
+
+def file_row(href, name, file_size, last_modified):
+    return f"<tr><td><a href='{href}'>{name}</a></td><td>{file_size}</td><td>{last_modified}</td></tr>"
+
+
+def reporter_row(base_url, reporter, volume, artifacts):
+    return (f"<tr><td><a href='{base_url}{reporter}/{volume}/'>{volume}</a></td>"
+            f"<td><a href='{base_url}{reporter}/{volume}.zip'>{volume}.zip</a></td>{artifacts}</tr>")
+
+
+def artifact_cell(base_url, reporter, volume, ext):
+    return f"<td><a href='{base_url}{reporter}/{volume}.{ext}'>{volume}.{ext}</a></td>"
+
+
+def page_link(href, label):
+    return f"<a href='{href}'>{label}</a>"
+
+
+def pagination(links):
+    return f"<p>{links}</p>"
+
 
 @task
-def create_html(ctx, level="root"):
+def create_html(ctx, level="root", incremental=False, since=None, reporter=None, volumes=None, volumes_file=None,
+                state_file=INDEX_STATE_FILE, page_size=0, encoding=None):
     """
     Creates and uploads index.html pages to the static bucket.
     -- Level options --
@@ -26,82 +96,119 @@ def create_html(ctx, level="root"):
     reporter: Creates and uploads reporter level htmls (e.g.: https://static.case.law/a2d/)
     volume: Creates and uploads volume level htmls (e.g.:
     https://static.case.law/a2d/31/, https://static.case.law/a2d/31/html/ and https://static.case.law/a2d/31/cases/)
+    -- Targeting options, for the reporter and volume levels --
+    since: Only volumes whose last_updated is at or after this ISO timestamp (e.g.: 2024-01-01T00:00:00+00:00)
+    reporter: Only volumes of this reporter
+    volumes, volumes_file: Only these volumes, as comma separated reporter/volume_folder pairs (e.g.: a2d/31,cal/1),
+    or one per line in a file, like the volumes file written by unredact.unredact-volumes
+    -- Incremental option, for the volume level --
+    incremental: Only renders pages whose listing changed since the last run, as recorded in state_file
+    -- Layout option, for the volume level --
+    page_size: Splits the cases, html and case-pdfs pages into pages of this many files, with previous and next
+    links (index.html, index-2.html, ...); 0 keeps every file on one page
+    Each volume folder also gets an index.json listing the name, size and mtime of its files
+    -- Encoding option --
+    encoding: Uploads the pages compressed, with this Content-Encoding (gzip or br)
     """
     level_options = ["root", "reporter", "volume"]
     assert level in level_options, f"Value '{level}' is not a valid option"
+    check_content_encoding(encoding)
 
-    volumes = json.loads(get_volumes_metadata(R2_STATIC_BUCKET))
+    volumes_metadata = json.loads(get_volumes_metadata(R2_STATIC_BUCKET))
+    volume_list = volumes.split(",") if volumes else None
+    if volumes_file:
+        with open(volumes_file) as file:
+            volume_list = (volume_list or []) + file.read().split()
+    volumes = select_volumes(volumes_metadata, since, reporter, volume_list)
 
     if level == "root":
         reporters = json.loads(get_reporters_metadata(R2_STATIC_BUCKET))
         root_level_html = create_root_level_html(reporters)
-        upload_root_level_file(root_level_html)
+        upload_root_level_file(root_level_html, encoding)
 
     if level == "reporter":
-        reporter_level_df = create_reporter_level_df(volumes)
-        upload_reporter_level_files(reporter_level_df)
+        # a reporter page lists all of the reporter's volumes, not just the selected ones
+        reporters = {volume["reporter_slug"] for volume in volumes}
+        reporter_level_df = create_reporter_level_df(
+            [volume for volume in volumes_metadata if volume["reporter_slug"] in reporters]
+        )
+        upload_reporter_level_files(reporter_level_df, encoding)
 
     if level == "volume":
-        volume_files = get_volume_files(volumes)
-        volume_root_level_df, volume_cases_level_df = create_grouped_dataframe(volume_files)
-        upload_volume_level_files(volume_root_level_df, 3)
-        upload_volume_level_files(volume_cases_level_df, 4)
+        state = load_index_state(state_file) if incremental else None
+        stale_pages = []
+        # one volume at a time, so memory is bounded by the largest volume rather than the bucket
+        failed_keys = upload_index_pages(
+            get_volume_level_pages(get_volume_files(volumes), state, page_size, encoding, stale_pages),
+            encoding=encoding, processes=RENDER_PROCESSES,
+        )
+        failed_folders = {key.rsplit("/", 1)[0] for key in failed_keys}
+        # pages past a folder's new page count are only dropped once its new pages are up, so no link breaks
+        delete_index_pages([key for key in stale_pages if key.rsplit("/", 1)[0] not in failed_folders])
+        if incremental:
+            # folders with a page that failed to upload are rendered again next time
+            state = {key: value for key, value in state.items() if key.rsplit("/", 1)[0] not in failed_folders}
+            save_index_state(state, state_file)
+
+
+def select_volumes(volumes, since=None, reporter=None, volume_list=None):
+    """
+    Selects the volumes updated since a timestamp, of a reporter, or in a list of reporter/volume_folder pairs
+    Returns all volumes when no option is given
+    """
+    if since:
+        since = datetime.fromisoformat(since)
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=pytz.utc)
+        volumes = [volume for volume in volumes
+                   if volume.get("last_updated") and datetime.fromisoformat(volume["last_updated"]) >= since]
+    if reporter:
+        volumes = [volume for volume in volumes if volume["reporter_slug"] == reporter]
+    if volume_list is not None:
+        volume_list = {volume.strip().strip("/") for volume in volume_list}
+        volumes = [volume for volume in volumes if f"{volume['reporter_slug']}/{volume['volume_folder']}" in volume_list]
+
+    return volumes
 
 
 def create_root_level_html(reporters):
     """
     Creates html for root level items - reporters and metadata files
     """
-    html = ("<style>table {width: 100%;}td, th {text-align: left;} th {padding-top: 5px; padding-bottom: 14px} ul {"
-            "font-size: 1.50em; font-weight: bold; padding: 0} li {display: inline;}</style>")
-    html += "<table><tr><th>Contents</th></tr>"
-
-    for reporter in reporters:
-        html += f"<tr><td><a href='{CAP_STATIC_BASE_URL}{reporter['slug']}/'>{reporter['slug']}</a></td></tr>"
-    html += f"<tr><td><a href='{CAP_STATIC_BASE_URL}ReportersMetadata.json'>ReportersMetadata.json</a></td></tr>"
-    html += f"<tr><td><a href='{CAP_STATIC_BASE_URL}VolumesMetadata.json'>VolumesMetadata.json</a></td></tr>"
-    html += (f"<tr><td><a href='{CAP_STATIC_BASE_URL}JurisdictionsMetadata.json'>"
-             f"JurisdictionsMetadata.json</a></td></tr>")
-    html += "</table>"
+    rows = [link_row(href=f"{CAP_STATIC_BASE_URL}{reporter['slug']}/", name=reporter["slug"]) for reporter in reporters]
+    rows += [link_row(href=f"{CAP_STATIC_BASE_URL}{name}", name=name)
+             for name in ["ReportersMetadata.json", "VolumesMetadata.json", "JurisdictionsMetadata.json"]]
 
-    return html
+    return render_page(["Contents"], rows)
 
 
-def upload_root_level_file(html):
+def upload_root_level_file(html, encoding=None):
     """
     Uploads index.html file to R2
     """
-    try:
-        r2_s3_client.put_object(Bucket=R2_STATIC_BUCKET, Key="index.html", Body=html, ContentType='text/html')
-    except Exception as error:
-        print(error)
+    upload_index_pages([("index.html", html)], encoding=encoding)
 
 
-def create_reporter_level_html(item):
+def create_reporter_level_html(item, reporter_artifacts=None):
     """
     Creates html for reporter level items
+    The reporter's artifacts are listed unless reporter_artifacts, from get_reporter_artifacts, is given
     """
-    r2_reporter_files = get_reporter_files(item['reporter_slug'])
-
-    volume_folders = [x for x in item["volume_folder"]]
-    volume_folders = natsorted(volume_folders)
-    html = ("<style>table {width: 100%;}td, th {text-align: left;} th {padding-top: 5px; padding-bottom: 14px} ul {"
-            "font-size: 1.50em; font-weight: bold; padding: 0} li {display: inline;}</style>")
-    html += f"<ul><li><a href='{CAP_STATIC_BASE_URL}'>Home</a></li><li> / </li><li>{item['reporter_slug']}</li></ul>"
-    html += "<table><tr><th>Volume</th><th>Zip</th><th>PDF</th><th>Tar</th><th>Tar.csv</th><th>Tar.sha256</th></tr>"
-
-    for volume in volume_folders:
-        html += f"<tr><td><a href='{CAP_STATIC_BASE_URL}{item['reporter_slug']}/{volume}/'>{volume}</a></td>"
-        html += f"<td><a href='{CAP_STATIC_BASE_URL}{item['reporter_slug']}/{volume}.zip'>{volume}.zip</a></td>"
-        html += create_artifacts_html(r2_reporter_files, item['reporter_slug'], volume)
-        html += "</tr>"
-    html += (f"<tr><td><a href='{CAP_STATIC_BASE_URL}{item['reporter_slug']}/"
-             f"ReporterMetadata.json'>ReporterMetadata.json</a></td></tr>")
-    html += (f"<tr><td><a href='{CAP_STATIC_BASE_URL}{item['reporter_slug']}/"
-             f"VolumesMetadata.json'>VolumesMetadata.json</a></td></tr>")
-    html += "</table>"
+    reporter = item['reporter_slug']
+    if reporter_artifacts is None:
+        reporter_artifacts = get_reporter_artifacts(reporter)
+
+    volume_folders = natsorted(item["volume_folder"])
+    rows = [
+        reporter_row(base_url=CAP_STATIC_BASE_URL, reporter=reporter, volume=volume,
+                     artifacts=create_artifacts_html(reporter_artifacts, reporter, volume))
+        for volume in volume_folders
+    ]
+    rows += [link_row(href=f"{CAP_STATIC_BASE_URL}{reporter}/{name}", name=name)
+             for name in ["ReporterMetadata.json", "VolumesMetadata.json"]]
 
-    return html
+    return render_page(["Volume", "Zip", "PDF", "Tar", "Tar.csv", "Tar.sha256"], rows,
+                       [("Home", CAP_STATIC_BASE_URL), (reporter, None)])
 
 
 def create_reporter_level_df(data):
@@ -114,33 +221,57 @@ def create_reporter_level_df(data):
     return reporter_level_df
 
 
-def upload_reporter_level_files(dataframe):
+def upload_reporter_level_files(dataframe, encoding=None):
     """
     Uploads index.html files to R2
     """
-    for index, row in dataframe.iterrows():
-        try:
-            r2_s3_client.put_object(Bucket=R2_STATIC_BUCKET, Key=f"{row['reporter_slug']}/index.html", Body=row["html"],
-                                    ContentType='text/html')
-        except Exception as error:
-            print(f"{row['reporter_slug']}: {error}")
+    upload_index_pages(((f"{row['reporter_slug']}/index.html", row["html"]) for index, row in dataframe.iterrows()),
+                       encoding=encoding, processes=RENDER_PROCESSES)
 
 
-def create_artifacts_html(reporter_files, reporter, volume):
+def create_artifacts_html(reporter_artifacts, reporter, volume):
     """
     Creates html for the volume artifacts such as pdf and tar files
     """
-    html = ""
-    extensions = ["pdf", "tar", "tar.csv", "tar.sha256"]
+    volume_artifacts = reporter_artifacts.get(volume, {})
+
+    return "".join(
+        artifact_cell(base_url=CAP_STATIC_BASE_URL, reporter=reporter, volume=volume, ext=ext)
+        if ext in volume_artifacts else "<td></td>"
+        for ext in ARTIFACT_EXTENSIONS
+    )
+
+
+def get_reporter_artifacts(reporter):
+    """
+    Gets the volume artifacts of a reporter from one listing of the top of the reporter's folder
+    The listing uses a delimiter, as artifacts sit next to the volume folders, so case files are never listed
+    """
+    return create_artifact_index(list_objects(R2_STATIC_BUCKET, f"{reporter}/", delimiter="/",
+                                                use_inventory=True), reporter)
+
+
+def create_artifact_index(items, reporter):
+    """
+    Indexes the volume artifacts among a reporter's listed files, in a single pass
+    Returns a dictionary of volume folder to a dictionary of artifact extension to size
+    e.g. {"31": {"pdf": 1024, "tar": 2048}}
+    """
+    reporter_artifacts = defaultdict(dict)
+    # longest first, so a2d/31.tar.csv is a tar.csv rather than a tar
+    extensions = sorted(ARTIFACT_EXTENSIONS, key=len, reverse=True)
 
-    for ext in extensions:
-        file_name = f"{reporter}/{volume}.{ext}"
-        if any(file_name in file for file in reporter_files):
-            html += f"<td><a href='{CAP_STATIC_BASE_URL}{file_name}'>{volume}.{ext}</a></td>"
-        else:
-            html += "<td></td>"
+    for item in items:
+        file_name = item["Key"][len(reporter) + 1:]
+        # artifacts sit next to the volume folders, not inside them
+        if "/" in file_name:
+            continue
+        for ext in extensions:
+            if file_name.endswith(f".{ext}"):
+                reporter_artifacts[file_name[:-len(ext) - 1]][ext] = item["Size"]
+                break
 
-    return html
+    return reporter_artifacts
 
 
 def create_volume_root_level_html(item):
@@ -150,108 +281,517 @@ def create_volume_root_level_html(item):
     item['file_location'] = list(dict.fromkeys(item['file_location']))
     # reverse the list to display cases and html paths first instead of metadata.json paths
     item['file_location'].reverse()
-    html = ("<style>table {width: 100%;}td, th {text-align: left;} th {padding-top: 5px; padding-bottom: 14px} ul {"
-            "font-size: 1.50em; font-weight: bold; padding: 0} li {display: inline;}</style>")
-    html += (f"<ul><li><a href='{CAP_STATIC_BASE_URL}'>Home</a></li><li> / </li><li><a href='{CAP_STATIC_BASE_URL}"
-             f"{item['reporter']}/'>{item['reporter']}</a></li><li> / </li><li>{item['volume']}</li></ul>")
-    html += "<table><tr><th>Contents</th></tr>"
+    volume_url = f"{CAP_STATIC_BASE_URL}{item['reporter']}/{item['volume']}/"
+
+    rows = [
+        link_row(href=f"{volume_url}{location}/" if location in ['cases', 'html', 'case-pdfs'] else
+                 f"{volume_url}{location}", name=location)
+        for location in item['file_location']
+    ]
 
-    for location in item['file_location']:
-        href = f"{CAP_STATIC_BASE_URL}{item['reporter']}/{item['volume']}/{location}"
-        if location in ['cases', 'html', 'case-pdfs']:
-            href = f"{href}/"
-        html += f"<tr><td><a href='{href}'>{location}</a></td></tr>"
-    html += "</table>"
+    return render_page(["Contents"], rows, [
+        ("Home", CAP_STATIC_BASE_URL),
+        (item['reporter'], f"{CAP_STATIC_BASE_URL}{item['reporter']}/"),
+        (item['volume'], None),
+    ])
 
-    return html
+
+def create_volume_root_level_pages(item):
+    """
+    Creates the index.html and index.json of a volume's root folder, yielding (key, body) pairs
+    """
+    folder = f"{item['reporter']}/{item['volume']}/"
+    # folders are listed with a trailing slash and no size or mtime
+    index_json = create_index_json(
+        (location, *item["files"][location]) if location in item["files"] else (f"{location}/", None, None)
+        for location in dict.fromkeys(item["file_location"])
+    )
+    yield f"{folder}index.html", create_volume_root_level_html(item)
+    yield f"{folder}index.json", index_json
 
 
-def create_volume_cases_level_html(item):
+def create_volume_cases_level_html(item, page=1, page_size=0):
     """
     Creates html for volume cases level - cases, html and case-pdfs folders
+    With a page_size, only the files of the given page are listed, with links to the previous and next pages
+    """
+    start = (page - 1) * page_size
+    stop = start + page_size if page_size else None
+    rows = [
+        file_row(href=f"{CAP_STATIC_BASE_URL}{key}", name=key.rsplit("/", 1)[-1], file_size=file_size,
+                 last_modified=last_modified)
+        for key, file_size, last_modified in zip(item["key"][start:stop], item["file_size"][start:stop],
+                                                 item["last_modified"][start:stop])
+    ]
+    folder_url = f"{CAP_STATIC_BASE_URL}{item['reporter']}/{item['volume']}/{item['file_location']}/"
+
+    return render_page(["File", "Size", "Last Modified"], rows, [
+        ("Home", CAP_STATIC_BASE_URL),
+        (item['reporter'], f"{CAP_STATIC_BASE_URL}{item['reporter']}/"),
+        (item['volume'], f"{CAP_STATIC_BASE_URL}{item['reporter']}/{item['volume']}/"),
+        (item['file_location'], None),
+    ], create_pagination_html(folder_url, page, get_page_count(len(item["key"]), page_size)))
+
+
+def create_volume_cases_level_pages(item, page_size=0):
+    """
+    Creates the html pages and index.json of a volume's cases, html or case-pdfs folder, yielding (key, body) pairs
+    With a page_size, the html is split into pages of that many files: index.html, then index-2.html and so on
+    """
+    folder = f"{item['reporter']}/{item['volume']}/{item['file_location']}/"
+    for page in range(1, get_page_count(len(item["key"]), page_size) + 1):
+        yield f"{folder}{get_page_file_name(page)}", create_volume_cases_level_html(item, page, page_size)
+    yield f"{folder}index.json", create_index_json(
+        zip((key.rsplit("/", 1)[-1] for key in item["key"]), item["size"], item["mtime"])
+    )
+
+
+def create_pagination_html(folder_url, page, page_count):
+    """
+    Creates the links to the previous and next pages of a paginated folder, or nothing if it has a single page
+    """
+    if page_count == 1:
+        return ""
+    links = [f"Page {page} of {page_count}"]
+    if page > 1:
+        links.insert(0, page_link(href=f"{folder_url}{get_page_file_name(page - 1)}", label="Previous"))
+    if page < page_count:
+        links.append(page_link(href=f"{folder_url}{get_page_file_name(page + 1)}", label="Next"))
+
+    return pagination(links=" | ".join(links))
+
+
+def get_page_count(row_count, page_size=0):
     """
-    html = ("<style>table {width: 100%;}td, th {text-align: left;} th {padding-top: 5px; padding-bottom: 14px} ul {"
-            "font-size: 1.50em; font-weight: bold; padding: 0} li {display: inline;}</style>")
-    html += (f"<ul><li><a href='{CAP_STATIC_BASE_URL}'>Home</a></li><li> / </li><li><a href='{CAP_STATIC_BASE_URL}"
-             f"{item['reporter']}/'>{item['reporter']}</a></li><li> / </li><li><a href='{CAP_STATIC_BASE_URL}"
-             f"{item['reporter']}/{item['volume']}/'>{item['volume']}</a></li><li> / </li><li>{item['file_location']}"
-             f"</li></ul>")
-    html += "<table><tr><th>File</th><th>Size</th><th>Last Modified</th></tr>"
+    Returns the number of pages a folder of row_count files is split into
+    """
+    return max(-(-row_count // page_size), 1) if page_size else 1
 
-    for index, key in enumerate(item["key"]):
-        file = re.split("/", key)[-1]
-        html += f"<tr><td><a href='{CAP_STATIC_BASE_URL}{key}'>{file}</a></td>"
-        html += f"<td>{item['file_size'][index]}</td>"
-        html += f"<td>{item['last_modified'][index]}</td></tr>"
-    html += "</table>"
 
-    return html
+def get_page_file_name(page):
+    """
+    Returns the file name of a page of a paginated folder: index.html for the first page, then index-2.html, ...
+    """
+    return "index.html" if page == 1 else f"index-{page}.html"
 
 
-def convert_time(time_obj):
+def create_index_json(entries):
     """
-    Converts the s3 datetime object to EST time
+    Creates the compact index.json of a folder from (name, size, mtime) entries
+    Sizes are in bytes and mtimes are ISO 8601 UTC timestamps, as listed by R2
     """
-    utc_datetime = time_obj.strftime("%m/%d/%Y %H:%M:%S")
-    parsed_datetime = datetime.strptime(utc_datetime, "%m/%d/%Y %H:%M:%S")
-    localized_datetime = pytz.utc.localize(parsed_datetime)
-    est_datetime = localized_datetime.astimezone(pytz.timezone('America/New_York'))
+    return json.dumps([{"name": name, "size": size, "mtime": mtime} for name, size, mtime in entries],
+                      separators=(",", ":"))
+
 
-    return est_datetime.strftime("%m/%d/%Y %H:%M:%S")
+def render_page(columns, rows, breadcrumbs=None, pagination=""):
+    """
+    Renders a page from the shared style, breadcrumbs and table fragments, joining all of its parts once
+    Breadcrumbs are (label, href) pairs, the last one being the current page, without an href
+    """
+    parts = [PAGE_HEADER]
+    if breadcrumbs:
+        parts.append("<ul>")
+        parts.append(BREADCRUMB_SEPARATOR.join(
+            breadcrumb_link(href=href, label=label) if href else breadcrumb(label=label) for label, href in breadcrumbs
+        ))
+        parts.append("</ul>")
+    parts.append(pagination)
+    parts.append(table_header(header_cells="".join(f"<th>{column}</th>" for column in columns)))
+    parts.extend(rows)
+    parts.append(TABLE_FOOTER)
+
+    return "".join(parts)
+
+
+def convert_times(times):
+    """
+    Converts s3 datetime objects to EST time strings, e.g. 03/04/2024 14:51:10, all at once
+    pandas converts the whole array with the timezone's transitions, which it looks up once and caches, rather than
+    localizing each time; numpy then formats the local times as ISO strings, which are only reordered here
+    """
+    local_times = pd.DatetimeIndex(pd.to_datetime(times, utc=True)).tz_convert(LOCAL_TIMEZONE).tz_localize(None)
+    return [f"{iso[5:7]}/{iso[8:10]}/{iso[:4]} {iso[11:]}"
+            for iso in np.datetime_as_string(local_times.values, unit="s").tolist()]
+
+
+def convert_sizes(sizes):
+    """
+    Formats sizes in bytes as KB strings, e.g. 2.0 KB or 1.46 KB, all at once
+    Sizes in KB are exact binary fractions, so rounding them as an array gives the same values as round(size, 2)
+    """
+    return [f"{size} KB" for size in np.round(np.asarray(sizes, dtype=np.int64) / 1024, 2).tolist()]
+
+
+def get_mtimes(times):
+    """
+    Formats s3 datetime objects as ISO 8601 UTC timestamps, e.g. 2024-03-04T19:51:10+00:00, all at once
+    """
+    utc_times = pd.DatetimeIndex(pd.to_datetime(times, utc=True)).tz_localize(None)
+    return [f"{iso}+00:00" for iso in np.datetime_as_string(utc_times.values, unit="s").tolist()]
 
 
 def get_volume_files(volumes):
     """
     Gets file names from R2
+    Yields the files of one volume at a time, in key order, as columns: key, file_size, last_modified, size and mtime
+    The listing is collected into columns first, so sizes and times are converted for the whole volume at once
+    The keys of the volume's existing html listing pages are added as index_pages
     """
-    files = []
-
     for volume in volumes:
         prefix = f"{volume['reporter_slug']}/{volume['volume_folder']}/"
-        for page in r2_paginator.paginate(Bucket=R2_STATIC_BUCKET, Prefix=prefix, PaginationConfig={"PageSize": 1000}):
-            for item in page["Contents"]:
-                # exclude /index.html as we don't want to display it among the volume files
-                if "/index.html" not in item["Key"]:
-                    files.append({"key": item["Key"], "file_size": f"{round(item['Size'] / 1024, 2)} KB",
-                                  "last_modified": convert_time(item["LastModified"])})
+        keys = []
+        sizes = []
+        times = []
+        index_pages = []
+        for item in list_objects(R2_STATIC_BUCKET, prefix, use_inventory=True):
+            # exclude the listing pages as we don't want to display them among the volume files
+            if is_index_file(item["Key"]):
+                if item["Key"].endswith(".html"):
+                    index_pages.append(item["Key"])
+            else:
+                keys.append(item["Key"])
+                sizes.append(item["Size"])
+                times.append(item["LastModified"])
+        if keys:
+            yield {
+                "key": keys,
+                "file_size": convert_sizes(sizes),
+                "last_modified": convert_times(times),
+                "size": sizes,
+                "mtime": get_mtimes(times),
+                "index_pages": index_pages,
+            }
+
+
+def create_volume_level_items(files):
+    """
+    Groups the files of a volume, as columns from get_volume_files, by their location in the volume, e.g. cases,
+    html or VolumeMetadata.json
+    Returns the volume root level item and the cases level items
+    """
+    reporter, volume = files["key"][0].split("/")[:2]
+    locations = defaultdict(list)
+    for index, key in enumerate(files["key"]):
+        locations[key.split("/")[2]].append(index)
+
+    volume_root_level_item = {
+        "reporter": reporter,
+        "volume": volume,
+        "file_location": list(locations),
+        # the files at the top of the volume folder, e.g. VolumeMetadata.json, with their size and mtime
+        "files": {
+            location: [files["size"][indexes[0]], files["mtime"][indexes[0]]]
+            for location, indexes in locations.items() if files["key"][indexes[0]] == f"{reporter}/{volume}/{location}"
+        },
+    }
+
+    volume_cases_level_items = []
+    for location in ["case-pdfs", "cases", "html"]:
+        if location not in locations:
+            continue
+        item = {"reporter": reporter, "volume": volume, "file_location": location}
+        for column in ["key", "file_size", "last_modified", "size", "mtime"]:
+            item[column] = [files[column][index] for index in locations[location]]
+        volume_cases_level_items.append(item)
+
+    return volume_root_level_item, volume_cases_level_items
+
+
+def get_volume_level_pages(volume_files, state=None, page_size=0, encoding=None, stale_pages=None):
+    """
+    Renders the root level and cases level pages of each volume, yielding (key, body) pairs
+    Each folder's html pages are followed by its index.json, and are paginated by page_size
+    With a state, folders whose inputs hash the same as in the state are skipped, and the state is updated with the
+    input hash and MD5 of the rendered pages; encoding is the Content-Encoding the pages will be uploaded with
+    With a stale_pages list, the existing html pages of rendered folders that are no longer rendered, e.g. index-3.html
+    of a folder that now has two pages, are added to it
+    """
+    for files in volume_files:
+        volume_root_level_item, volume_cases_level_items = create_volume_level_items(files)
+        folders = [(f"{volume_root_level_item['reporter']}/{volume_root_level_item['volume']}/index.html",
+                    volume_root_level_item, create_volume_root_level_pages)]
+        folders += [(f"{item['reporter']}/{item['volume']}/{item['file_location']}/index.html",
+                     item, partial(create_volume_cases_level_pages, page_size=page_size))
+                    for item in volume_cases_level_items]
+
+        for index_key, item, create_pages in folders:
+            input_hash = get_page_input_hash(item, page_size, encoding)
+            if state is not None and state.get(index_key, {}).get("input") == input_hash:
+                continue
+            page_keys = set()
+            for key, body in create_pages(item):
+                if state is not None:
+                    state[key] = {"input": input_hash, "md5": hashlib.md5(body.encode("utf-8")).hexdigest()}
+                page_keys.add(key)
+                yield key, body
+            if stale_pages is not None:
+                folder = index_key.removesuffix("index.html")
+                stale_pages += [key for key in files.get("index_pages", [])
+                                if key.rsplit("/", 1)[0] + "/" == folder and key not in page_keys]
+
+
+def get_page_input_hash(item, page_size=0, encoding=None):
+    """
+    Hashes everything a folder's pages are rendered from: its part of the volume listing, the page size and the
+    base url, along with the Content-Encoding they are uploaded with
+    """
+    page_input = json.dumps([CAP_STATIC_BASE_URL, page_size, encoding, item], sort_keys=True)
+    return hashlib.sha256(page_input.encode("utf-8")).hexdigest()
 
-    return files
 
+def load_index_state(state_file=INDEX_STATE_FILE):
+    """
+    Loads the input hash and html MD5 of each page rendered by previous incremental runs
+    """
+    try:
+        with open(state_file) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
 
-def create_grouped_dataframe(files):
+
+def save_index_state(state, state_file=INDEX_STATE_FILE):
     """
-    Creates new columns from the file paths
-    Creates html column from the grouped rows
+    Saves the state file, replacing it at once so an interrupted save doesn't lose it
     """
-    df = pd.DataFrame.from_dict(files)
-    df.insert(0, "file_location", df.key.str.split("/").str[2])
-    df.insert(0, "volume", df.key.str.split("/").str[1])
-    df.insert(0, "reporter", df.key.str.split("/").str[0])
+    with open(f"{state_file}.tmp", "w") as file:
+        json.dump(state, file)
+    os.replace(f"{state_file}.tmp", state_file)
 
-    volume_root_level_df = df.groupby(["reporter", "volume"], as_index=False).agg(list)
-    volume_cases_level_df = df.groupby(["reporter", "volume", "file_location"], as_index=False).agg(list)
-    volume_cases_level_df = volume_cases_level_df[
-        (volume_cases_level_df['file_location'] == "cases") |
-        (volume_cases_level_df['file_location'] == "html") |
-        (volume_cases_level_df['file_location'] == "case-pdfs")
-    ]
 
-    volume_root_level_df['html'] = volume_root_level_df.apply(lambda row: create_volume_root_level_html(row), axis=1)
-    volume_cases_level_df['html'] = volume_cases_level_df.apply(lambda row: create_volume_cases_level_html(row), axis=1)
+def upload_index_pages(pages, workers=UPLOAD_WORKERS, encoding=None, processes=0):
+    """
+    Uploads (key, html) pages concurrently, skipping pages that are identical to the uploaded ones
+    Pages are taken from the iterable as upload slots free up, so a generator of pages is never run far ahead
+    With an encoding, pages are compressed first, in a pool of processes unless processes is 0
+    Returns the keys of the pages that failed to upload
+    """
+    bodies = ((key, html.encode("utf-8")) for key, html in pages)
+    if encoding:
+        bodies = compress_pages(bodies, encoding, processes)
+    in_flight = threading.BoundedSemaphore(workers * 2)
+    futures = []
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for key, body in bodies:
+            in_flight.acquire()
+            future = executor.submit(upload_index_page, key, body, encoding)
+            future.add_done_callback(lambda _: in_flight.release())
+            futures.append((key, len(body), future))
+
+    results = {key: future.result() for key, _, future in futures}
+    uploaded_count = sum(result is True for result in results.values())
+    uploaded_bytes = sum(size for key, size, _ in futures if results[key] is True)
+    failed_keys = [key for key, result in results.items() if result is None]
+    print(f"{uploaded_count} of {len(results)} index files were uploaded ({uploaded_bytes / 1e6:.1f} MB), "
+          f"{len(failed_keys)} failed, the others were unchanged")
+    return failed_keys
+
+
+def upload_index_page(key, body, encoding=None):
+    """
+    Uploads an index.html or index.json file unless the MD5 of its body matches the ETag of the existing file
+    An encoded body is uploaded as is, with its Content-Encoding
+    Returns whether the file was uploaded, or None if the upload failed
+    """
+    try:
+        if get_page_etag(key) == f'"{hashlib.md5(body).hexdigest()}"':
+            return False
+        content_type = "application/json" if key.endswith(".json") else "text/html"
+        r2_s3_client.put_object(Bucket=R2_STATIC_BUCKET, Key=key, Body=body, ContentType=content_type,
+                                **({"ContentEncoding": encoding} if encoding else {}))
+        return True
+    except Exception as error:
+        print(f"{key}: {error}")
+        return None
+
 
-    return volume_root_level_df, volume_cases_level_df
+def delete_index_pages(keys):
+    """
+    Deletes listing pages that are no longer part of their folder
+    """
+    for start in range(0, len(keys), 1000):
+        objects = [{"Key": key} for key in keys[start:start + 1000]]
+        r2_s3_client.delete_objects(Bucket=R2_STATIC_BUCKET, Delete={"Objects": objects, "Quiet": True})
+    if keys:
+        print(f"{len(keys)} index pages past the end of their folder were deleted")
 
 
-def upload_volume_level_files(dataframe, level):
+def get_page_etag(key):
     """
-    Uploads index.html files to R2
+    Gets the ETag of an uploaded page with a HEAD request, or None if there is no such page
+    An inventory snapshot isn't used here, as pages uploaded since it was taken would show their old ETag
+    """
+    try:
+        return r2_s3_client.head_object(Bucket=R2_STATIC_BUCKET, Key=key)["ETag"]
+    except ClientError:
+        return None
+
+
+def compress_pages(pages, encoding, processes=RENDER_PROCESSES):
+    """
+    Compresses (key, body) pages with a Content-Encoding in a pool of processes, yielding (key, body) pairs in order
+    Only a few pages per process are compressed ahead of the uploads, so a generator of pages is never run far ahead
+    """
+    ahead = deque()
+    with get_process_executor(processes) as executor:
+        for key, body in pages:
+            ahead.append((key, executor.submit(encode_body, body, encoding)))
+            if len(ahead) >= max(processes, 1) * 4:
+                key, future = ahead.popleft()
+                yield key, future.result()
+        while ahead:
+            key, future = ahead.popleft()
+            yield key, future.result()
+
+
+def get_process_executor(processes):
+    """
+    Returns a pool of processes for CPU bound work, spawned rather than forked as in split_pdfs
+    With no processes, the work runs in a single thread of this process instead
+    """
+    if not processes:
+        return ThreadPoolExecutor(max_workers=1)
+    return ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn"))
+
+
+@task
+def render_html(ctx, output, processes=RENDER_PROCESSES, page_size=0):
+    """
+    Renders every index.html page of the static site to a local directory or tarball, without uploading them
+    A .tar, .tar.gz or .tgz output is written as a tarball; publish it with publish-html
+    Listing happens in this process, rendering in a pool of processes (0 renders in this process)
+    page_size paginates the volume folders, as for create-html
+    """
+    volumes = json.loads(get_volumes_metadata(R2_STATIC_BUCKET))
+    reporters = json.loads(get_reporters_metadata(R2_STATIC_BUCKET))
+    start_time = time.monotonic()
+
+    if output.endswith((".tar", ".tar.gz", ".tgz")):
+        with tempfile.TemporaryDirectory() as output_dir:
+            page_count, page_bytes = render_site(volumes, reporters, output_dir, processes, page_size)
+            write_tarball(output_dir, output)
+    else:
+        page_count, page_bytes = render_site(volumes, reporters, output, processes, page_size)
+
+    elapsed = time.monotonic() - start_time
+    print(f"{page_count} index files ({page_bytes / 1e6:.1f} MB) were rendered to {output} in {elapsed:.1f}s "
+          f"({page_count / elapsed:.0f} pages/s)")
+
+
+@task
+def publish_html(ctx, source, workers=MAX_POOL_CONNECTIONS, encoding=None, processes=RENDER_PROCESSES):
+    """
+    Uploads the index.html pages rendered by render-html, from a directory or tarball, skipping unchanged pages
+    With an encoding (gzip or br), pages are compressed in a pool of processes and uploaded with that Content-Encoding
+    """
+    check_content_encoding(encoding)
+    start_time = time.monotonic()
+    failed_keys = upload_index_pages(read_rendered_pages(source), workers, encoding, processes)
+    print(f"Published {source} in {time.monotonic() - start_time:.1f}s")
+    if failed_keys:
+        print(f"Failed to upload: {', '.join(failed_keys)}")
+
+
+def render_site(volumes, reporters, output_dir, processes=RENDER_PROCESSES, page_size=0):
+    """
+    Renders the root, reporter and volume level pages to output_dir, as files named after their keys
+    Returns the number of pages and bytes written
+    """
+    reporter_volumes = defaultdict(list)
+    for volume in volumes:
+        reporter_volumes[volume["reporter_slug"]].append(volume["volume_folder"])
+    results = [write_pages([("index.html", create_root_level_html(reporters))], output_dir)]
+
+    executor = get_process_executor(processes)
+    in_flight = threading.BoundedSemaphore(max(processes, 1) * 2)
+    futures = []
+
+    def submit(function, *args):
+        in_flight.acquire()
+        future = executor.submit(function, *args)
+        future.add_done_callback(lambda _: in_flight.release())
+        futures.append(future)
+
+    with executor:
+        for reporter, volume_folders in reporter_volumes.items():
+            submit(render_reporter_page, reporter, volume_folders, get_reporter_artifacts(reporter), output_dir)
+        for files in get_volume_files(volumes):
+            submit(render_volume_pages, files, output_dir, page_size)
+
+    results += [future.result() for future in futures]
+    return sum(count for count, _ in results), sum(size for _, size in results)
+
+
+def render_reporter_page(reporter, volume_folders, reporter_artifacts, output_dir):
+    """
+    Renders and writes a reporter level page, in a render process
+    """
+    html = create_reporter_level_html({"reporter_slug": reporter, "volume_folder": volume_folders},
+                                      reporter_artifacts)
+    return write_pages([(f"{reporter}/index.html", html)], output_dir)
+
+
+def render_volume_pages(files, output_dir, page_size=0):
+    """
+    Renders and writes the root level and cases level pages of a volume, in a render process
+    """
+    return write_pages(get_volume_level_pages([files], page_size=page_size), output_dir)
+
+
+def write_pages(pages, output_dir):
     """
-    for index, row in dataframe.iterrows():
-        key = f"{row['reporter']}/{row['volume']}/index.html"
-        if level == 4:
-            key = f"{row['reporter']}/{row['volume']}/{row['file_location']}/index.html"
+    Writes (key, html) pages under output_dir
+    Returns the number of pages and bytes written
+    """
+    page_count = 0
+    page_bytes = 0
+    for key, html in pages:
+        path = os.path.join(output_dir, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        body = html.encode("utf-8")
+        with open(path, "wb") as file:
+            file.write(body)
+        page_count += 1
+        page_bytes += len(body)
+
+    return page_count, page_bytes
+
 
-        try:
-            r2_s3_client.put_object(Bucket=R2_STATIC_BUCKET, Key=key, Body=row["html"], ContentType='text/html')
-        except Exception as error:
-            print(f"{key}: {error}")
+def write_tarball(output_dir, output):
+    """
+    Packs a rendered tree into a tarball, with members in sorted order
+    """
+    with tarfile.open(output, "w:gz" if output.endswith(("gz", ".tgz")) else "w") as tar:
+        for key, path in get_rendered_paths(output_dir):
+            tar.add(path, arcname=key)
+
+
+def get_rendered_paths(output_dir):
+    """
+    Returns the (key, path) pairs of the pages rendered under output_dir, sorted by key
+    """
+    paths = []
+    for root, _, file_names in os.walk(output_dir):
+        for file_name in file_names:
+            path = os.path.join(root, file_name)
+            paths.append((os.path.relpath(path, output_dir).replace(os.sep, "/"), path))
+
+    return sorted(paths)
+
+
+def read_rendered_pages(source):
+    """
+    Yields the (key, html) pages of a rendered directory or tarball, one at a time
+    """
+    if os.path.isdir(source):
+        for key, path in get_rendered_paths(source):
+            with open(path, encoding="utf-8") as file:
+                yield key, file.read()
+        return
+
+    with tarfile.open(source) as tar:
+        for member in tar:
+            if member.isfile():
+                yield member.name, tar.extractfile(member).read().decode("utf-8")
@@ -1,7 +1,30 @@
 import os
+import gzip
+import hashlib
+import io
+import json
+import re
+import shutil
+import sqlite3
+import struct
+import tempfile
+import threading
+import time
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import closing
+from datetime import datetime
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
+try:
+    import brotli
+except ImportError:
+    # only needed to upload or read objects with the br Content-Encoding
+    brotli = None
+
 # config
 S3_ARCHIVE_BUCKET = os.environ.get("S3_ARCHIVE_BUCKET")
 S3_PDF_FOLDER = os.environ.get("S3_PDF_FOLDER")
@@ -21,6 +44,40 @@ S3_CAPTAR_UNREDACTED_FOLDER = os.environ.get("S3_CAPTAR_UNREDACTED_FOLDER")
 OBJECT_PATHS_FILE = os.environ.get("OBJECT_PATHS_FILE")
 VOLUMES_TO_UNREDACT_FILE = os.environ.get("VOLUMES_TO_UNREDACT_FILE")
 CAP_STATIC_BASE_URL = os.environ.get("CAP_STATIC_BASE_URL")
+# input hashes of the index.html pages rendered by create-html --incremental
+INDEX_STATE_FILE = os.environ.get("INDEX_STATE_FILE", "index_html_state.json")
+# local LRU cache of downloaded objects, shared by all tasks; caching is off unless CACHE_DIR is set
+CACHE_DIR = os.environ.get("CACHE_DIR")
+CACHE_MAX_BYTES = int(os.environ.get("CACHE_MAX_BYTES", 50 * 1024 ** 3))
+# local SQLite snapshots of bucket listings, written by inventory.snapshot and read by list_objects calls that opt in
+# while they are younger than INVENTORY_MAX_AGE seconds; listings go to the bucket unless INVENTORY_DIR is set
+INVENTORY_DIR = os.environ.get("INVENTORY_DIR")
+INVENTORY_MAX_AGE = int(os.environ.get("INVENTORY_MAX_AGE", 24 * 60 * 60))
+# concurrent LIST requests made by list_objects_sharded, and how many delimiter levels it splits a prefix into
+LISTING_WORKERS = 16
+LISTING_SHARD_DEPTH = 2
+# parts of streamed multipart uploads; every part but the last must be at least 5 MiB
+MULTIPART_PART_SIZE = 16 * 1024 * 1024
+# connections kept open by each client, shared by all threads using it
+MAX_POOL_CONNECTIONS = 50
+# Content-Encodings that index pages and metadata files can be uploaded with, precompressed
+CONTENT_ENCODINGS = ["gzip", "br"]
+
+# zip format constants used by the ranged zip reader
+ZIP_EOCD_SIGNATURE = b"PK\x05\x06"
+ZIP_EOCD_STRUCT = struct.Struct("<4s4H2LH")
+ZIP64_EOCD_LOCATOR_STRUCT = struct.Struct("<4sLQL")
+ZIP64_EOCD_STRUCT = struct.Struct("<4sQ2H2L4Q")
+ZIP_CENTRAL_HEADER_STRUCT = struct.Struct("<4s6H3L5H2L")
+ZIP_LOCAL_HEADER_STRUCT = struct.Struct("<4s5H3L2H")
+ZIP64_LIMIT = 0xFFFFFFFF
+# the end of central directory record can be followed by a comment of up to 64 KiB
+ZIP_TAIL_SIZE = 0xFFFF + ZIP_EOCD_STRUCT.size + ZIP64_EOCD_LOCATOR_STRUCT.size
+# zip-volumes publishes a range index of each volume zip next to it, under the zip's key plus this suffix
+ZIP_INDEX_SUFFIX = ".index.json"
+# listing pages written into the static bucket's folders by create-index-html, e.g. index.html, index-2.html and
+# index.json, which aren't volume files
+INDEX_FILE_NAME = re.compile(r"index(-\d+)?\.html|index\.json")
 
 # clients
 s3_client = boto3.client(
@@ -36,24 +93,35 @@ r2_s3_client = boto3.client(
     aws_access_key_id=R2_ACCESS_KEY_ID,
     aws_secret_access_key=R2_ACCESS_KEY,
     region_name="auto",
+    config=Config(max_pool_connections=MAX_POOL_CONNECTIONS),
 )
 r2_paginator = r2_s3_client.get_paginator("list_objects_v2")
 
 
 def get_volumes_metadata(r2_bucket=R2_UNREDACTED_BUCKET):
     """
-    Gets the root level VolumesMetadata.json contents
+    Gets the root level VolumesMetadata.json contents, decoded if it was uploaded with a Content-Encoding
     """
-    volumes_metadata = r2_s3_client.get_object(Bucket=r2_bucket, Key="VolumesMetadata.json")
-    return volumes_metadata["Body"].read().decode("utf-8")
+    return read_object(r2_bucket, "VolumesMetadata.json", r2_s3_client).decode("utf-8")
 
 
 def get_reporters_metadata(r2_bucket=R2_UNREDACTED_BUCKET):
     """
     Gets the root level VolumesMetadata.json contents
     """
-    reporters_metadata = r2_s3_client.get_object(Bucket=r2_bucket, Key="ReportersMetadata.json")
-    return reporters_metadata["Body"].read().decode("utf-8")
+    return read_object(r2_bucket, "ReportersMetadata.json", r2_s3_client).decode("utf-8")
+
+
+def get_case_sources_metadata(r2_bucket=R2_STATIC_BUCKET):
+    """
+    Gets the root level CaseSourcesMetadata.json contents, written by split-pdfs.summarize-case-sources
+    """
+    try:
+        case_sources_metadata = r2_s3_client.get_object(Bucket=r2_bucket, Key="CaseSourcesMetadata.json")
+        return case_sources_metadata["Body"].read().decode("utf-8")
+    except ClientError as e:
+        print(f"Case sources metadata not found in {r2_bucket} bucket: {e}")
+        return
 
 
 def write_paths_to_file(files, file_name=OBJECT_PATHS_FILE):
@@ -84,21 +152,846 @@ def get_reporter_volumes_metadata(bucket, reporter):
     key = f"{reporter}/VolumesMetadata.json"
     try:
         volumes_metadata = r2_s3_client.get_object(Bucket=bucket, Key=key)
-        return volumes_metadata["Body"].read().decode("utf-8")
+        return decode_body(volumes_metadata["Body"].read(), volumes_metadata.get("ContentEncoding")).decode("utf-8")
     except ClientError as e:
         print(f"Reporter volume metadata not found in {bucket} bucket: {key}: {e}")
         return
 
 
-def get_reporter_files(reporter):
+def list_objects(bucket, prefix="", delimiter=None, s3_client=r2_s3_client, shard_depth=0, use_inventory=False):
     """
-    Gets all files of a reporter
+    Lists the objects under a prefix, as dictionaries with the Key, Size, ETag and LastModified fields of
+    list_objects_v2, in key order
+    With use_inventory, a fresh inventory snapshot of the bucket is read instead of listing the bucket, when there is
+    one; callers that compare ETags or must see every current object list the bucket
+    With delimiter="/", only the objects directly under the prefix are returned
+    With a shard_depth, large prefixes are listed concurrently by list_objects_sharded, in no particular order
     """
-    files = []
+    if use_inventory and is_inventory_fresh(bucket):
+        for item in query_inventory(bucket, prefix):
+            if not delimiter or delimiter not in item["Key"][len(prefix):]:
+                yield item
+        return
+
+    if shard_depth and not delimiter:
+        yield from list_objects_sharded(bucket, prefix, s3_client, shard_depth)
+        return
+
+    list_kwargs = {"Delimiter": delimiter} if delimiter else {}
+    for page in s3_client.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=prefix, **list_kwargs,
+                                                                    PaginationConfig={"PageSize": 1000}):
+        yield from page.get("Contents", [])
+
+
+def get_inventory_path(bucket):
+    return os.path.join(INVENTORY_DIR, f"{bucket}.sqlite3")
+
+
+def get_inventory_age(bucket):
+    """
+    Returns the age in seconds of the inventory snapshot of a bucket, or None if there is none
+    """
+    if not INVENTORY_DIR or not os.path.exists(get_inventory_path(bucket)):
+        return None
+    with closing(sqlite3.connect(get_inventory_path(bucket))) as connection:
+        listed_at, = connection.execute("SELECT value FROM inventory WHERE name = 'listed_at'").fetchone()
+    return time.time() - float(listed_at)
+
+
+def is_inventory_fresh(bucket):
+    inventory_age = get_inventory_age(bucket)
+    return inventory_age is not None and inventory_age <= INVENTORY_MAX_AGE
+
+
+def query_inventory(bucket, prefix=""):
+    """
+    Yields the objects of a bucket's inventory snapshot whose keys start with prefix
+    Keys are the primary key of the snapshot, so this is a range scan rather than a full scan
+    """
+    with closing(sqlite3.connect(get_inventory_path(bucket))) as connection:
+        rows = connection.execute(
+            "SELECT key, size, etag, last_modified FROM objects WHERE key >= ? AND key < ? ORDER BY key",
+            (prefix, prefix + chr(0x10FFFF)),
+        )
+        for key, size, etag, last_modified in rows:
+            yield {"Key": key, "Size": size, "ETag": etag, "LastModified": datetime.fromisoformat(last_modified)}
+
+
+def create_inventory(bucket, s3_client=r2_s3_client, workers=LISTING_WORKERS):
+    """
+    Lists a whole bucket into an SQLite snapshot under INVENTORY_DIR, replacing the previous snapshot
+    Returns the number of objects in the snapshot
+    """
+    listed_at = time.time()
+
+    # write to a temporary file, so readers never see a partial snapshot
+    os.makedirs(INVENTORY_DIR, exist_ok=True)
+    path = get_inventory_path(bucket)
+    temp_path = f"{path}.tmp"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    count = 0
+
+    with closing(sqlite3.connect(temp_path)) as connection:
+        connection.execute("CREATE TABLE inventory (name TEXT PRIMARY KEY, value TEXT)")
+        connection.execute(
+            "CREATE TABLE objects (key TEXT PRIMARY KEY, size INTEGER, etag TEXT, last_modified TEXT) WITHOUT ROWID"
+        )
+        for item in list_objects_sharded(bucket, s3_client=s3_client, workers=workers):
+            connection.execute("INSERT INTO objects VALUES (?, ?, ?, ?)",
+                               (item["Key"], item["Size"], item["ETag"], item["LastModified"].isoformat()))
+            count += 1
+        connection.execute("INSERT INTO inventory VALUES ('listed_at', ?)", (str(listed_at),))
+        connection.commit()
+
+    os.replace(temp_path, path)
+    return count
+
+
+def list_objects_sharded(bucket, prefix="", s3_client=r2_s3_client, shard_depth=LISTING_SHARD_DEPTH,
+                         workers=LISTING_WORKERS):
+    """
+    Lists the objects under a prefix with concurrent LIST requests, one stream of pages per shard
+    Shards are discovered with delimited listings, shard_depth levels down: under the bucket root, reporters and then
+    volume folders. Each shard is listed as soon as it is discovered, so discovery and listing overlap
+    Yields the same dictionaries as list_objects_v2, a shard at a time in the order shards finish, not in key order
+    """
+    paginator = s3_client.get_paginator("list_objects_v2")
+
+    def list_shard(shard_prefix, depth):
+        """
+        Lists one shard, returning its objects and, above the last level, the sub-prefixes to list next
+        """
+        items = []
+        sub_prefixes = []
+        list_kwargs = {"Delimiter": "/"} if depth else {}
+        for page in paginator.paginate(Bucket=bucket, Prefix=shard_prefix, **list_kwargs,
+                                       PaginationConfig={"PageSize": 1000}):
+            items += page.get("Contents", [])
+            sub_prefixes += [common_prefix["Prefix"] for common_prefix in page.get("CommonPrefixes", [])]
+        return items, sub_prefixes, depth - 1
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {executor.submit(list_shard, prefix, shard_depth)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                items, sub_prefixes, depth = future.result()
+                pending |= {executor.submit(list_shard, sub_prefix, depth) for sub_prefix in sub_prefixes}
+                yield from items
+
+
+def get_object_range(bucket, key, byte_range, s3_client=r2_s3_client, **get_kwargs):
+    """
+    Gets a byte range of an object, e.g. "bytes=0-99" or "bytes=-100"
+    Returns the bytes and the total size of the object
+    """
+    response = s3_client.get_object(Bucket=bucket, Key=key, Range=byte_range, **get_kwargs)
+    total_size = int(response["ContentRange"].split("/")[-1])
+    return response["Body"].read(), total_size
+
+
+def get_zip_entries(bucket, key, s3_client=r2_s3_client):
+    """
+    Reads the central directory of a zip object with range requests
+    Returns a list of dictionaries with the name, offset, sizes and crc of each file in the archive
+    """
+    tail, total_size = get_object_range(bucket, key, f"bytes=-{ZIP_TAIL_SIZE}", s3_client)
+    tail_start = total_size - len(tail)
+
+    def read_bytes(start, length):
+        # reuse the tail we already have when possible, otherwise make another range request
+        if start >= tail_start:
+            return tail[start - tail_start:start - tail_start + length]
+        return get_object_range(bucket, key, f"bytes={start}-{start + length - 1}", s3_client)[0]
+
+    eocd_position = tail.rfind(ZIP_EOCD_SIGNATURE)
+    if eocd_position == -1:
+        raise zipfile.BadZipFile(f"End of central directory not found in {key}")
+    _, _, _, _, entry_count, cd_size, cd_offset, _ = ZIP_EOCD_STRUCT.unpack_from(tail, eocd_position)
+
+    if 0xFFFFFFFF in (cd_size, cd_offset) or entry_count == 0xFFFF:
+        locator_position = eocd_position - ZIP64_EOCD_LOCATOR_STRUCT.size
+        _, _, zip64_eocd_offset, _ = ZIP64_EOCD_LOCATOR_STRUCT.unpack_from(tail, locator_position)
+        zip64_eocd = read_bytes(zip64_eocd_offset, ZIP64_EOCD_STRUCT.size)
+        _, _, _, _, _, _, _, entry_count, cd_size, cd_offset = ZIP64_EOCD_STRUCT.unpack(zip64_eocd)
+
+    central_directory = read_bytes(cd_offset, cd_size)
+    entries = []
+    position = 0
+
+    for _ in range(entry_count):
+        (signature, _, _, flags, compression, _, _, crc, compressed_size, file_size, name_length, extra_length,
+         comment_length, _, _, _, header_offset) = ZIP_CENTRAL_HEADER_STRUCT.unpack_from(central_directory, position)
+        if signature != b"PK\x01\x02":
+            raise zipfile.BadZipFile(f"Bad central directory entry in {key}")
+        position += ZIP_CENTRAL_HEADER_STRUCT.size
+        name = central_directory[position:position + name_length]
+        extra = central_directory[position + name_length:position + name_length + extra_length]
+        position += name_length + extra_length + comment_length
+
+        # large archives keep sizes and offsets in the zip64 extra field
+        extra_position = 0
+        while extra_position + 4 <= len(extra):
+            header_id, data_size = struct.unpack_from("<2H", extra, extra_position)
+            if header_id == 0x0001:
+                values = iter(struct.unpack_from(f"<{data_size // 8}Q", extra, extra_position + 4))
+                if file_size == 0xFFFFFFFF:
+                    file_size = next(values)
+                if compressed_size == 0xFFFFFFFF:
+                    compressed_size = next(values)
+                if header_offset == 0xFFFFFFFF:
+                    header_offset = next(values)
+            extra_position += 4 + data_size
+
+        entries.append({
+            "name": name.decode("utf-8" if flags & 0x800 else "cp437"),
+            "header_offset": header_offset,
+            "compression": compression,
+            "compressed_size": compressed_size,
+            "file_size": file_size,
+            "crc": crc,
+            "flags": flags,
+            "extra_length": extra_length,
+        })
+
+    return entries
+
+
+def read_zip_entry(bucket, key, entry, s3_client=r2_s3_client):
+    """
+    Fetches and decompresses a single zip entry returned by get_zip_entries
+    """
+    if entry["flags"] & 0x1:
+        raise NotImplementedError(f"Encrypted zip entries are not supported: {entry['name']}")
+
+    # the local header usually repeats the central directory's name and extra fields,
+    # so this range normally covers the header and the compressed data in one request
+    start = entry["header_offset"]
+    length = (ZIP_LOCAL_HEADER_STRUCT.size + len(entry["name"].encode("utf-8")) + entry["extra_length"]
+              + entry["compressed_size"])
+    chunk = get_object_range(bucket, key, f"bytes={start}-{start + length - 1}", s3_client)[0]
+
+    signature, _, _, _, _, _, _, _, _, name_length, extra_length = ZIP_LOCAL_HEADER_STRUCT.unpack_from(chunk)
+    if signature != b"PK\x03\x04":
+        raise zipfile.BadZipFile(f"Bad local file header for {entry['name']} in {key}")
+    data_start = ZIP_LOCAL_HEADER_STRUCT.size + name_length + extra_length
+    data = chunk[data_start:data_start + entry["compressed_size"]]
+    if len(data) < entry["compressed_size"]:
+        data_end = start + data_start + entry["compressed_size"] - 1
+        data += get_object_range(bucket, key, f"bytes={start + len(chunk)}-{data_end}", s3_client)[0]
+
+    return decompress_zip_data(data, entry["compression"], entry["crc"], entry["name"], key)
+
+
+def decompress_zip_data(data, compression, crc, name, key):
+    """
+    Decompresses the raw data of a zip entry and checks its CRC-32
+    """
+    if compression == zipfile.ZIP_STORED:
+        content = data
+    elif compression == zipfile.ZIP_DEFLATED:
+        content = zlib.decompress(data, -zlib.MAX_WBITS)
+    else:
+        raise NotImplementedError(f"Unsupported compression method {compression} for {name}")
+
+    if zlib.crc32(content) != crc:
+        raise zipfile.BadZipFile(f"Bad CRC-32 for file {name} in {key}")
+
+    return content
+
+
+def get_zip_member(bucket, key, name_suffix, s3_client=r2_s3_client):
+    """
+    Reads a single file out of a zip object without downloading the whole archive
+    Only the end of central directory record, the central directory and the file itself are fetched
+    Returns the contents of the first file whose name ends with name_suffix, or None if there is no match
+    """
+    if CACHE_DIR:
+        # the member is cached under the archive's ETag, and revalidated with a conditional HEAD
+        cache_name = f"{key}#{name_suffix}"
+        etag, path = get_cache_entry(bucket, cache_name)
+        try:
+            etag = s3_client.head_object(Bucket=bucket, Key=key, **({"IfNoneMatch": etag} if path else {}))["ETag"]
+        except ClientError as e:
+            if not is_not_modified(e):
+                # let the range requests below raise the error, e.g. NoSuchKey for a missing archive
+                etag = None
+            else:
+                touch_cache_entry(path)
+                with open(path, "rb") as cached_file:
+                    return cached_file.read()
+
+    entries = get_zip_entries(bucket, key, s3_client)
+    entry = next((entry for entry in entries if entry["name"].endswith(name_suffix)), None)
+    if entry is None:
+        return None
+
+    content = read_zip_entry(bucket, key, entry, s3_client)
+    if CACHE_DIR and etag:
+        put_cache_entry(bucket, cache_name, etag, io.BytesIO(content))
+    return content
+
+
+def get_zip_index_key(key):
+    """
+    Returns the key of the range index published next to a zip, e.g. a2d/100.zip.index.json
+    """
+    return f"{key}{ZIP_INDEX_SUFFIX}"
+
+
+def is_index_file(key):
+    """
+    Returns whether a key is a listing page written by create-index-html, e.g. a2d/1/cases/index.json
+    """
+    return INDEX_FILE_NAME.fullmatch(key.rsplit("/", 1)[-1]) is not None
+
+
+def create_zip_index(entries, etag, size):
+    """
+    Creates the range index of a zip written by ZipStreamWriter, from its entries, ETag and size
+    Each member maps to the offset and size of its compressed data, so a single range request fetches one file
+    """
+    return {
+        "etag": etag,
+        "size": size,
+        "members": {
+            entry["name"]: {
+                "offset": entry["data_offset"],
+                "compressed_size": entry["compressed_size"],
+                "file_size": entry["file_size"],
+                "crc": entry["crc"],
+                "compression": entry["compress_type"],
+            }
+            for entry in entries
+        },
+    }
+
+
+def get_zip_index(bucket, key, s3_client=r2_s3_client):
+    """
+    Reads the range index published next to a zip
+    Returns None if the zip has no index
+    """
+    try:
+        return json.loads(read_object(bucket, get_zip_index_key(key), s3_client))
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+            return None
+        raise
+
+
+def read_indexed_zip_member(bucket, key, name, zip_index=None, s3_client=r2_s3_client):
+    """
+    Reads a single file out of a zip with one range request, using the range index published next to it
+    Pass the zip_index returned by get_zip_index to read several files with a single index fetch
+    Zips without an index are read through their central directory instead
+    The range request is conditional on the zip's ETag, so it fails if the zip was replaced after the index was read
+    Returns the contents of the file, or None if there is no file with that name
+    """
+    if zip_index is None:
+        zip_index = get_zip_index(bucket, key, s3_client)
+    if zip_index is None:
+        entry = next((entry for entry in get_zip_entries(bucket, key, s3_client) if entry["name"] == name), None)
+        return read_zip_entry(bucket, key, entry, s3_client) if entry else None
+
+    member = zip_index["members"].get(name)
+    if member is None:
+        return None
+
+    data = b""
+    if member["compressed_size"]:
+        start = member["offset"]
+        data = get_object_range(bucket, key, f"bytes={start}-{start + member['compressed_size'] - 1}", s3_client,
+                                IfMatch=zip_index["etag"])[0]
+    return decompress_zip_data(data, member["compression"], member["crc"], name, key)
+
+
+def get_cached_object(bucket, key, s3_client=r2_s3_client):
+    """
+    Returns the path of a local copy of an object, kept in the LRU disk cache under CACHE_DIR
+    A cached copy is revalidated with a conditional GET (If-None-Match), so unchanged objects aren't downloaded again
+    Cached files are shared and may be evicted: copy or link them rather than modifying or keeping the path
+    """
+    etag, path = get_cache_entry(bucket, key)
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=key, **({"IfNoneMatch": etag} if path else {}))
+    except ClientError as e:
+        if not is_not_modified(e):
+            raise
+        touch_cache_entry(path)
+        return path
+
+    # precompressed objects are cached decoded, as they are read
+    body = response["Body"]
+    if response.get("ContentEncoding") in CONTENT_ENCODINGS:
+        body = io.BytesIO(decode_body(body.read(), response["ContentEncoding"]))
+    return put_cache_entry(bucket, key, response["ETag"], body)
+
+
+def download_object(bucket, key, local_path, s3_client=r2_s3_client):
+    """
+    Downloads an object to local_path, through the cache when CACHE_DIR is set
+    """
+    if not CACHE_DIR:
+        s3_client.download_file(bucket, key, local_path)
+        return
+
+    cached_path = get_cached_object(bucket, key, s3_client)
+    if os.path.exists(local_path):
+        os.unlink(local_path)
+    try:
+        os.link(cached_path, local_path)
+    except OSError:
+        shutil.copyfile(cached_path, local_path)
+
+
+def read_object(bucket, key, s3_client=r2_s3_client):
+    """
+    Returns the contents of an object, through the cache when CACHE_DIR is set
+    Objects uploaded with a Content-Encoding, e.g. by put_encoded_object, are decoded
+    """
+    if not CACHE_DIR:
+        response = s3_client.get_object(Bucket=bucket, Key=key)
+        return decode_body(response["Body"].read(), response.get("ContentEncoding"))
+
+    with open(get_cached_object(bucket, key, s3_client), "rb") as cached_file:
+        return cached_file.read()
+
+
+def get_cache_digest(*parts):
+    return hashlib.sha256("/".join(parts).encode("utf-8")).hexdigest()
+
+
+def get_cache_entry(bucket, key):
+    """
+    Returns the cached ETag and file path of an object, or (None, None) if it isn't cached
+    """
+    entry_path = os.path.join(CACHE_DIR, "entries", f"{get_cache_digest(bucket, key)}.json")
+    try:
+        with open(entry_path) as entry_file:
+            etag = json.load(entry_file)["etag"]
+    except (OSError, ValueError):
+        return None, None
+
+    path = os.path.join(CACHE_DIR, "objects", get_cache_digest(bucket, key, etag))
+    return (etag, path) if os.path.exists(path) else (None, None)
+
+
+def put_cache_entry(bucket, key, etag, body):
+    """
+    Stores a file-like body in the cache as the version of an object with the given ETag
+    Files are content-addressed by bucket, key and ETag and written atomically, so concurrent readers are safe
+    """
+    old_etag, old_path = get_cache_entry(bucket, key)
+    path = os.path.join(CACHE_DIR, "objects", get_cache_digest(bucket, key, etag))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.makedirs(os.path.join(CACHE_DIR, "entries"), exist_ok=True)
+
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), delete=False) as temp_file:
+        shutil.copyfileobj(body, temp_file, 1024 * 1024)
+    os.replace(temp_file.name, path)
+
+    entry_path = os.path.join(CACHE_DIR, "entries", f"{get_cache_digest(bucket, key)}.json")
+    with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(entry_path), delete=False) as temp_file:
+        json.dump({"bucket": bucket, "key": key, "etag": etag}, temp_file)
+    os.replace(temp_file.name, entry_path)
+
+    size = os.path.getsize(path)
+    if old_path and old_etag != etag:
+        size -= remove_cache_file(old_path)
+    update_cache_size(size, keep=path)
+    return path
+
+
+def touch_cache_entry(path):
+    """
+    Marks a cached file as recently used; eviction removes the least recently used files first
+    """
+    os.utime(path)
 
-    for page in r2_paginator.paginate(Bucket=R2_STATIC_BUCKET, Prefix=f"{reporter}/", PaginationConfig={"PageSize": 1000}):
-        for item in page["Contents"]:
-            files.append(item["Key"])
 
+def is_not_modified(error):
+    return error.response["Error"]["Code"] in ("304", "NotModified")
+
+
+def remove_cache_file(path):
+    try:
+        size = os.path.getsize(path)
+        os.unlink(path)
+        return size
+    except OSError:
+        return 0
+
+
+cache_size = None
+cache_lock = threading.Lock()
+
+
+def update_cache_size(added_bytes, keep=None):
+    """
+    Keeps a running total of the cache size, and evicts least recently used files once it passes CACHE_MAX_BYTES
+    Eviction goes down to 90% of the limit, so the cache directory isn't scanned on every download
+    """
+    global cache_size
+
+    with cache_lock:
+        if cache_size is None:
+            cache_size = sum(size for _, size, _ in scan_cache()) - added_bytes
+        cache_size += added_bytes
+        if cache_size <= CACHE_MAX_BYTES:
+            return
+
+        files = scan_cache()
+        cache_size = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if cache_size <= CACHE_MAX_BYTES * 0.9:
+                break
+            if path != keep:
+                cache_size -= remove_cache_file(path)
+
+
+def scan_cache():
+    """
+    Returns (last used time, size, path) of each cached file
+    """
+    objects_dir = os.path.join(CACHE_DIR, "objects")
+    if not os.path.isdir(objects_dir):
+        return []
+
+    files = []
+    for entry in os.scandir(objects_dir):
+        if entry.is_file() and not entry.name.startswith("tmp"):
+            stat = entry.stat()
+            files.append((stat.st_mtime, stat.st_size, entry.path))
     return files
 
+
+class MultipartUploadWriter:
+    """
+    A write-only file object that streams into an S3 multipart upload
+    Parts are uploaded in the background as they fill, with at most max_pending_parts waiting to upload, so memory
+    is bounded by a few parts rather than by the size of the object
+    Objects smaller than one part are uploaded with a single put_object when the writer is closed
+    Leaving a `with` block with an exception aborts the upload instead of completing it
+    If skip_if_etag is the ETag the object would get, the existing object is left alone and skipped is set
+    With skip_if_etag, parts are spooled to a temp file rather than uploaded until the ETag can be compared on close,
+    so an identical object costs no write requests at all
+    Once closed, etag is the ETag of the object
+    """
+
+    def __init__(self, bucket, key, s3_client=r2_s3_client, part_size=MULTIPART_PART_SIZE, max_pending_parts=2,
+                 skip_if_etag=None, **put_kwargs):
+        self.bucket = bucket
+        self.key = key
+        self.s3_client = s3_client
+        self.part_size = part_size
+        self.put_kwargs = put_kwargs
+        self.buffer = bytearray()
+        self.position = 0
+        self.upload_id = None
+        self.parts = []
+        self.part_md5s = []
+        self.skip_if_etag = skip_if_etag
+        self.spool = tempfile.TemporaryFile() if skip_if_etag else None
+        self.spooled_sizes = []
+        self.skipped = False
+        self.etag = None
+        self.closed = False
+        self.pending_parts = threading.BoundedSemaphore(max_pending_parts)
+        self.executor = ThreadPoolExecutor(max_workers=max_pending_parts)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def write(self, data):
+        self.buffer += data
+        self.position += len(data)
+        while len(self.buffer) >= self.part_size:
+            self.upload_part(bytes(self.buffer[:self.part_size]))
+            del self.buffer[:self.part_size]
+        return len(data)
+
+    def upload_part(self, data):
+        self.part_md5s.append(hashlib.md5(data).digest())
+        if self.spool is not None:
+            self.spool.write(data)
+            self.spooled_sizes.append(len(data))
+        else:
+            self.send_part(data)
+
+    def send_part(self, data):
+        if self.upload_id is None:
+            self.upload_id = self.s3_client.create_multipart_upload(
+                Bucket=self.bucket, Key=self.key, **self.put_kwargs
+            )["UploadId"]
+
+        # wait for an earlier part to finish uploading before holding on to another one
+        self.pending_parts.acquire()
+        part_number = len(self.parts) + 1
+        future = self.executor.submit(
+            self.s3_client.upload_part, Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+            PartNumber=part_number, Body=data,
+        )
+        future.add_done_callback(lambda _: self.pending_parts.release())
+        self.parts.append((part_number, future))
+
+    def close(self):
+        """
+        Uploads what is left in the buffer and completes the upload
+        """
+        if self.closed:
+            return
+        try:
+            if not self.part_md5s:
+                self.etag = get_etag([hashlib.md5(self.buffer).digest()])
+                self.skipped = self.skip_if_etag == self.etag
+                if not self.skipped:
+                    self.s3_client.put_object(Bucket=self.bucket, Key=self.key, Body=bytes(self.buffer),
+                                              **self.put_kwargs)
+            else:
+                if self.buffer:
+                    self.upload_part(bytes(self.buffer))
+                self.etag = get_etag(self.part_md5s, multipart=True)
+                if self.skip_if_etag == self.etag:
+                    self.skipped = True
+                    self.abort()
+                    return
+                if self.spool is not None:
+                    self.spool.seek(0)
+                    for size in self.spooled_sizes:
+                        self.send_part(self.spool.read(size))
+                parts = [{"PartNumber": number, "ETag": future.result()["ETag"]} for number, future in self.parts]
+                self.s3_client.complete_multipart_upload(
+                    Bucket=self.bucket, Key=self.key, UploadId=self.upload_id, MultipartUpload={"Parts": parts}
+                )
+        except Exception:
+            self.abort()
+            raise
+        finally:
+            self.executor.shutdown()
+            self.close_spool()
+            self.closed = True
+
+    def abort(self):
+        """
+        Drops the upload without creating or changing the object
+        """
+        self.executor.shutdown()
+        self.close_spool()
+        self.closed = True
+        if self.upload_id is not None:
+            self.s3_client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+            self.upload_id = None
+
+    def close_spool(self):
+        if self.spool is not None:
+            self.spool.close()
+            self.spool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+
+
+def get_etag(part_md5s, multipart=False):
+    """
+    Computes the ETag S3 gives an object from the MD5 digests of its parts: the MD5 of a single put object, or the
+    MD5 of the part digests followed by the part count for a multipart upload
+    """
+    if not multipart:
+        return f'"{part_md5s[0].hex()}"'
+    return f'"{hashlib.md5(b"".join(part_md5s)).hexdigest()}-{len(part_md5s)}"'
+
+
+def compress_zip_entry(name, content, date_time, compresslevel=zlib.Z_DEFAULT_COMPRESSION):
+    """
+    Compresses a file into a raw deflate stream ready to be appended to a zip with ZipStreamWriter
+    zlib releases the GIL while compressing, so entries can be compressed in parallel threads
+    Content that doesn't shrink is stored uncompressed
+    """
+    compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, -zlib.MAX_WBITS)
+    data = compressor.compress(content) + compressor.flush()
+    compress_type = zipfile.ZIP_DEFLATED
+    if len(data) >= len(content):
+        data = content
+        compress_type = zipfile.ZIP_STORED
+
+    return {
+        "name": name,
+        "data": data,
+        "compress_type": compress_type,
+        "crc": zlib.crc32(content),
+        "compressed_size": len(data),
+        "file_size": len(content),
+        "date_time": date_time,
+    }
+
+
+class ZipStreamWriter:
+    """
+    Writes a zip archive to a file object from entries compressed ahead of time by compress_zip_entry
+    Appending an entry only writes its local header and data, so it is cheap enough to do under a lock
+    The file object only needs write(), so this works with unseekable streams like MultipartUploadWriter
+    Entries added with an index are written in index order whatever order they arrive in, so the same entries
+    always produce the same archive
+    on_write, if given, is called with each entry once it has been written, e.g. to let another one be fetched
+    """
+
+    def __init__(self, fileobj, on_write=None):
+        self.fileobj = fileobj
+        self.on_write = on_write
+        self.position = 0
+        self.entries = []
+        self.pending_entries = {}
+        self.next_index = 0
+
+    def write(self, data):
+        self.fileobj.write(data)
+        self.position += len(data)
+
+    def add_entry(self, entry, index=None):
+        """
+        Appends a compressed entry
+        With an index, an entry that arrives early is held until the entries before it have been written
+        """
+        if index is None:
+            self.write_entry(entry)
+            return
+
+        self.pending_entries[index] = entry
+        while self.next_index in self.pending_entries:
+            self.write_entry(self.pending_entries.pop(self.next_index))
+            self.next_index += 1
+
+    def write_entry(self, entry):
+        if entry["file_size"] > ZIP64_LIMIT or entry["compressed_size"] > ZIP64_LIMIT:
+            raise zipfile.LargeZipFile(f"{entry['name']} is too large to add to a zip")
+
+        name = entry["name"].encode("utf-8")
+        flags = 0 if name.isascii() else 0x800
+        dos_time, dos_date = get_dos_date_time(entry["date_time"])
+        header_offset = self.position
+        data_offset = header_offset + ZIP_LOCAL_HEADER_STRUCT.size + len(name)
+
+        self.write(ZIP_LOCAL_HEADER_STRUCT.pack(
+            b"PK\x03\x04", 20, flags, entry["compress_type"], dos_time, dos_date, entry["crc"],
+            entry["compressed_size"], entry["file_size"], len(name), 0,
+        ))
+        self.write(name)
+        self.write(entry["data"])
+        self.entries.append({**entry, "data": None, "header_offset": header_offset, "data_offset": data_offset})
+        if self.on_write:
+            self.on_write(entry)
+
+    def close(self):
+        """
+        Writes the central directory and end of central directory records, using zip64 records when needed
+        """
+        # entries still held back are missing an earlier entry, e.g. because its fetch failed
+        for index in sorted(self.pending_entries):
+            self.write_entry(self.pending_entries.pop(index))
+
+        cd_offset = self.position
+
+        for entry in self.entries:
+            name = entry["name"].encode("utf-8")
+            flags = 0 if name.isascii() else 0x800
+            dos_time, dos_date = get_dos_date_time(entry["date_time"])
+            header_offset = entry["header_offset"]
+            extra = b""
+            if header_offset > ZIP64_LIMIT:
+                extra = struct.pack("<2HQ", 0x0001, 8, header_offset)
+                header_offset = ZIP64_LIMIT
+
+            self.write(ZIP_CENTRAL_HEADER_STRUCT.pack(
+                b"PK\x01\x02", (3 << 8) | 45 if extra else (3 << 8) | 20, 45 if extra else 20, flags,
+                entry["compress_type"], dos_time, dos_date, entry["crc"], entry["compressed_size"],
+                entry["file_size"], len(name), len(extra), 0, 0, 0, 0o600 << 16, header_offset,
+            ))
+            self.write(name)
+            self.write(extra)
+
+        cd_size = self.position - cd_offset
+        entry_count = len(self.entries)
+
+        if entry_count >= 0xFFFF or cd_offset > ZIP64_LIMIT or cd_size > ZIP64_LIMIT:
+            zip64_eocd_offset = self.position
+            self.write(ZIP64_EOCD_STRUCT.pack(
+                b"PK\x06\x06", ZIP64_EOCD_STRUCT.size - 12, 45, 45, 0, 0, entry_count, entry_count, cd_size,
+                cd_offset,
+            ))
+            self.write(ZIP64_EOCD_LOCATOR_STRUCT.pack(b"PK\x06\x07", 0, zip64_eocd_offset, 1))
+            entry_count = min(entry_count, 0xFFFF)
+            cd_size = min(cd_size, ZIP64_LIMIT)
+            cd_offset = min(cd_offset, ZIP64_LIMIT)
+
+        self.write(ZIP_EOCD_STRUCT.pack(ZIP_EOCD_SIGNATURE, 0, 0, entry_count, entry_count, cd_size, cd_offset, 0))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+
+
+def get_dos_date_time(date_time):
+    """
+    Packs a (year, month, day, hour, minute, second) tuple into the zip format's DOS time and date
+    """
+    year, month, day, hour, minute, second = date_time
+    return (hour << 11) | (minute << 5) | (second // 2), ((year - 1980) << 9) | (month << 5) | day
+
+
+def check_content_encoding(content_encoding):
+    """
+    Checks that a Content-Encoding, if any, is one that objects can be uploaded with, and that it can be encoded
+    Raises ValueError otherwise
+    """
+    if content_encoding and content_encoding not in CONTENT_ENCODINGS:
+        raise ValueError(f"Value '{content_encoding}' is not a valid content encoding")
+    if content_encoding == "br" and not brotli:
+        raise ValueError("The br content encoding needs the brotli package")
+
+
+def encode_body(body, content_encoding=None):
+    """
+    Compresses a body with a Content-Encoding, or returns it as is without one
+    gzip bodies get a fixed timestamp, so the same body always compresses to the same bytes, and ETag
+    """
+    check_content_encoding(content_encoding)
+    if content_encoding == "gzip":
+        return gzip.compress(body, compresslevel=9, mtime=0)
+    if content_encoding == "br":
+        return brotli.compress(body, mode=brotli.MODE_TEXT)
+    return body
+
+
+def decode_body(body, content_encoding=None):
+    """
+    Decompresses a body that was uploaded with the gzip or br Content-Encoding
+    Bodies with any other Content-Encoding, such as identity or aws-chunked, or none are returned as is
+    """
+    if content_encoding == "gzip":
+        return gzip.decompress(body)
+    if content_encoding == "br":
+        check_content_encoding(content_encoding)
+        return brotli.decompress(body)
+    return body
+
+
+def put_encoded_object(bucket, key, body, content_type, content_encoding=None, s3_client=r2_s3_client):
+    """
+    Uploads a body with its Content-Type, compressed and with a Content-Encoding if one is given
+    """
+    s3_client.put_object(Bucket=bucket, Key=key, Body=encode_body(body, content_encoding), ContentType=content_type,
+                         **({"ContentEncoding": content_encoding} if content_encoding else {}))
@@ -0,0 +1,25 @@
+from invoke import task
+
+from .helpers import (
+    create_inventory,
+    get_inventory_age,
+    r2_s3_client,
+    R2_STATIC_BUCKET,
+    INVENTORY_DIR,
+    INVENTORY_MAX_AGE,
+    LISTING_WORKERS,
+)
+
+
+@task
+def snapshot(ctx, bucket=R2_STATIC_BUCKET, force=False, workers=LISTING_WORKERS):
+    """ Lists a bucket into a local inventory snapshot that other tasks read instead of listing the bucket. """
+    assert INVENTORY_DIR, "Set INVENTORY_DIR to keep inventory snapshots"
+
+    inventory_age = get_inventory_age(bucket)
+    if not force and inventory_age is not None and inventory_age <= INVENTORY_MAX_AGE:
+        print(f"Inventory of {bucket} is {inventory_age / 60:.0f} minutes old, use --force to refresh it")
+        return
+
+    object_count = create_inventory(bucket, r2_s3_client, workers)
+    print(f"{object_count} objects of {bucket} were written to the inventory")
@@ -1,26 +1,64 @@
 import os
-import zipfile
 import io
+import multiprocessing
+import queue
+import threading
 from invoke import task
 from pypdf import PdfReader, PdfWriter
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 import json
+import hashlib
+import heapq
 import tempfile
 
 from .helpers import (
     r2_s3_client as production_s3_client,
     get_volumes_metadata,
+    get_case_sources_metadata,
+    get_zip_member,
+    download_object,
+    list_objects,
     R2_STATIC_BUCKET,
     R2_SPLIT_PDFS_BUCKET,
 )
 
 READ_BUCKET = R2_STATIC_BUCKET
 WRITE_BUCKET = R2_SPLIT_PDFS_BUCKET
+# per-volume completion manifests in WRITE_BUCKET, kept apart from the case PDFs
+MANIFEST_PREFIX = "split-pdfs-manifests/"
+
+# concurrency of each pipeline stage; splitting is CPU-bound, downloads and uploads are I/O-bound
+DOWNLOAD_WORKERS = 4
+SPLIT_WORKERS = os.cpu_count()
+UPLOAD_WORKERS = 4
+# case PDF uploads in flight across all upload workers; keep within the client's connection pool
+UPLOAD_CONCURRENCY = 32
+# threads reading CasesMetadata.json when summarizing case sources
+SCAN_WORKERS = 16
+
+# marks the end of work on a pipeline queue
+STOP = object()
 
 
 @task
-def split_pdfs(ctx, reporter=None, volume=None, publication_year=None, s3_client=None):
+def split_pdfs(
+    ctx,
+    reporter=None,
+    volume=None,
+    publication_year=None,
+    s3_client=None,
+    download_workers=DOWNLOAD_WORKERS,
+    split_workers=SPLIT_WORKERS,
+    upload_workers=UPLOAD_WORKERS,
+    queue_size=0,
+    upload_concurrency=UPLOAD_CONCURRENCY,
+    spill_threshold=0,
+    force=False,
+    disk_budget_mb=0,
+    memory_budget_mb=0,
+):
     """Split PDFs into individual case files for all jurisdictions or a specific reporter."""
     print(
         f"Starting split_pdfs task for reporter: {reporter}, year: {publication_year}"
@@ -34,22 +72,307 @@ def split_pdfs(ctx, reporter=None, volume=None, publication_year=None, s3_client
     total_volumes = len(volumes_to_process)
     print(f"Total volumes to process: {total_volumes}")
 
-    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
-        futures = [
-            executor.submit(process_volume, v, s3_client)
-            for v in volumes_to_process
-        ]
+    volumes_to_process = schedule_volumes(volumes_to_process, split_workers, s3_client)
+
+    process_volumes(
+        volumes_to_process,
+        s3_client,
+        download_workers=download_workers,
+        split_workers=split_workers,
+        upload_workers=upload_workers,
+        queue_size=queue_size or split_workers,
+        upload_concurrency=upload_concurrency,
+        spill_threshold=spill_threshold,
+        force=force,
+        disk_budget=disk_budget_mb * 1024 * 1024,
+        memory_budget=memory_budget_mb * 1024 * 1024,
+    )
+
+    print(f"Processed {total_volumes} volumes.")
+
+
+def schedule_volumes(volumes, workers=SPLIT_WORKERS, s3_client=production_s3_client):
+    """
+    Orders volumes largest PDF first, so a few big volumes that start last don't drag out the run
+    PDF sizes and ETags come from the listing and are added to each volume as pdf_size and pdf_etag
+    Prints the expected makespan, in bytes of PDF per split worker, for the original and the new order
+    """
+    pdf_objects = get_volume_pdf_objects(volumes, s3_client)
+    volumes = [
+        {**v, **pdf_objects.get((v["reporter_slug"], v["volume_folder"]), {"pdf_size": 0})}
+        for v in volumes
+    ]
+    sizes = [v["pdf_size"] for v in volumes]
+    volumes = sorted(volumes, key=lambda v: v["pdf_size"], reverse=True)
+
+    if volumes:
+        lower_bound = max(max(sizes), sum(sizes) / workers)
+        print(
+            f"Expected makespan for {workers} workers: {estimate_makespan(sizes, workers) / 1e6:.1f} MB in metadata "
+            f"order, {estimate_makespan(sorted(sizes, reverse=True), workers) / 1e6:.1f} MB largest first "
+            f"(lower bound {lower_bound / 1e6:.1f} MB)"
+        )
+
+    return volumes
+
+
+def estimate_makespan(sizes, workers):
+    """
+    Simulates handing jobs in the given order to whichever worker frees up first
+    Returns the largest amount of work any worker ends up with
+    """
+    loads = [0] * workers
+    for size in sizes:
+        heapq.heapreplace(loads, loads[0] + size)
+
+    return max(loads)
+
+
+def get_volume_pdf_objects(volumes, s3_client=production_s3_client):
+    """
+    Gets the size and ETag of each volume PDF with one listing per reporter
+    The listing uses a delimiter, so only top level objects are returned and case files are never listed
+    It goes to the bucket rather than an inventory snapshot, as the ETags make up the volumes' fingerprints
+    Returns a dictionary of (reporter, volume folder) to pdf_size and pdf_etag
+    """
+    pdf_objects = {}
+
+    for reporter in sorted(set(v["reporter_slug"] for v in volumes)):
+        prefix = f"{reporter}/"
+        for item in list_objects(READ_BUCKET, prefix, delimiter="/", s3_client=s3_client):
+            if item["Key"].endswith(".pdf"):
+                volume_folder = item["Key"][len(prefix):].removesuffix(".pdf")
+                pdf_objects[(reporter, volume_folder)] = {"pdf_size": item["Size"], "pdf_etag": item["ETag"]}
+
+    return pdf_objects
+
+
+@task
+def summarize_case_sources(ctx, reporter=None, workers=SCAN_WORKERS, s3_client=None):
+    """Records the case sources of each volume, so split-pdfs can skip all-Fastcase volumes up front."""
+    if s3_client is None:
+        s3_client = production_s3_client
 
-        for future in tqdm(
-            as_completed(futures), total=total_volumes, desc="Processing Volumes"
-        ):
+    volumes = json.loads(get_volumes_metadata(READ_BUCKET))
+    if reporter:
+        volumes = [v for v in volumes if v["reporter_slug"] == reporter]
+
+    # keep the summaries of volumes that are not being scanned this time
+    case_sources_metadata = get_case_sources_metadata(READ_BUCKET)
+    summaries = {
+        (summary["reporter_slug"], summary["volume_folder"]): summary
+        for summary in json.loads(case_sources_metadata or "[]")
+    }
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(summarize_volume_case_sources, v, s3_client) for v in volumes]
+        for future in tqdm(as_completed(futures), total=len(volumes), desc="Scanning Volumes"):
+            summary = future.result()
+            if summary:
+                summaries[(summary["reporter_slug"], summary["volume_folder"])] = summary
+
+    fastcase_only_count = sum(summary["fastcase_only"] for summary in summaries.values())
+    print(f"{fastcase_only_count} of {len(summaries)} volumes are all-Fastcase")
+    s3_client.put_object(Bucket=READ_BUCKET, Key="CaseSourcesMetadata.json", Body=json.dumps(list(summaries.values())),
+                         ContentType="application/json")
+
+
+def summarize_volume_case_sources(volume, s3_client=production_s3_client):
+    """
+    Counts the cases of a volume by provenance source
+    """
+    cases_metadata = get_cases_metadata(s3_client, READ_BUCKET, volume)
+    if not cases_metadata:
+        return None
+
+    case_sources = Counter(case["provenance"]["source"] for case in cases_metadata)
+    return {
+        "reporter_slug": volume["reporter_slug"],
+        "volume_folder": volume["volume_folder"],
+        "case_sources": dict(case_sources),
+        "fastcase_only": set(case_sources) == {"Fastcase"},
+    }
+
+
+def process_volumes(
+    volumes,
+    s3_client=production_s3_client,
+    download_workers=DOWNLOAD_WORKERS,
+    split_workers=SPLIT_WORKERS,
+    upload_workers=UPLOAD_WORKERS,
+    queue_size=SPLIT_WORKERS,
+    upload_concurrency=UPLOAD_CONCURRENCY,
+    spill_threshold=0,
+    force=False,
+    disk_budget=0,
+    memory_budget=0,
+):
+    """
+    Runs volumes through a download -> split -> upload pipeline
+    Downloads and uploads run on I/O threads, splitting runs in a process pool since pypdf holds the GIL
+    Bounded queues between the stages hold back downloads when splitting or uploading falls behind
+    Case PDFs are kept in memory unless larger than spill_threshold bytes, and all upload threads share one
+    executor of upload_concurrency case uploads
+    Volumes whose split manifest matches their current inputs are skipped, unless force is set
+    Downloads are held back while the volume PDFs and spilled case PDFs on disk would exceed disk_budget bytes,
+    and splits while the case PDFs in memory would exceed memory_budget bytes, based on each volume's pdf_size
+    Returns the result of each volume
+    """
+    volume_queue = queue.Queue()
+    split_queue = queue.Queue(maxsize=queue_size)
+    upload_queue = queue.Queue(maxsize=queue_size)
+    for volume in volumes:
+        volume_queue.put(volume)
+
+    disk = ByteBudget(disk_budget)
+    memory = ByteBudget(memory_budget)
+    results = []
+    results_lock = threading.Lock()
+    progress = tqdm(total=len(volumes), desc="Processing Volumes")
+
+    def finish(result):
+        with results_lock:
+            results.append(result)
+            progress.update()
+        print(f"Processed volume result: {result}")
+
+    def download_worker():
+        while True:
             try:
-                result = future.result()
-                print(f"Processed volume result: {result}")
+                volume = volume_queue.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                job = prepare_volume(volume, s3_client, force, disk)
             except Exception as e:
-                print(f"Error processing volume: {e}")
+                finish(f"Error processing volume {volume['volume_folder']}: {str(e)}")
+                continue
+            if job is None:
+                finish(None)
+            else:
+                split_queue.put(job)
 
-    print(f"Processed {total_volumes} volumes.")
+    def split_worker(executor):
+        while (job := split_queue.get()) is not STOP:
+            volume = job["volume"]
+            # the case PDFs of a volume take up about as much memory as the volume PDF
+            memory.acquire(volume.get("pdf_size", 0))
+            try:
+                case_pdfs = executor.submit(split_pdf, job["pdf_path"], job["cases_to_split"], spill_threshold).result()
+                print(f"Split {len(case_pdfs)} case PDFs")
+            except Exception as e:
+                memory.release(volume.get("pdf_size", 0))
+                print(
+                    f"Error processing volume {volume['volume_folder']} of {volume['reporter_slug']}: {str(e)}"
+                )
+                finish(f"Error processing volume {volume['volume_folder']}: {str(e)}")
+                continue
+            finally:
+                os.unlink(job["pdf_path"])
+                disk.release(volume.get("pdf_size", 0))
+            # swap the estimate for the actual size of the case PDFs, in memory or spilled to disk
+            job["memory_size"], job["disk_size"] = get_case_pdfs_sizes(case_pdfs)
+            memory.release(volume.get("pdf_size", 0))
+            memory.add(job["memory_size"])
+            disk.add(job["disk_size"])
+            upload_queue.put((job, case_pdfs))
+
+    def upload_worker():
+        while (item := upload_queue.get()) is not STOP:
+            job, case_pdfs = item
+            volume = job["volume"]
+            try:
+                uploaded_case_pdfs = {**job["uploaded_case_pdfs"]}
+                if len(case_pdfs):
+                    uploaded_case_pdfs.update(upload_case_pdfs(case_pdfs, volume, s3_client, upload_executor))
+                missing = put_split_manifest(volume, job["fingerprint"], job["cases_metadata"], uploaded_case_pdfs,
+                                             s3_client)
+                if missing:
+                    finish(f"Error processing volume {volume['volume_folder']}: {len(missing)} case PDFs missing")
+                else:
+                    finish(f"Processed {len(case_pdfs)} cases for volume {volume['volume_folder']}")
+            except Exception as e:
+                finish(f"Error processing volume {volume['volume_folder']}: {str(e)}")
+            finally:
+                memory.release(job["memory_size"])
+                disk.release(job["disk_size"])
+
+    # spawn rather than fork, as forking while the I/O threads are running is unsafe
+    with (
+        ProcessPoolExecutor(max_workers=split_workers, mp_context=multiprocessing.get_context("spawn")) as executor,
+        ThreadPoolExecutor(max_workers=upload_concurrency) as upload_executor,
+    ):
+        downloaders = start_threads(download_worker, download_workers)
+        splitters = start_threads(split_worker, split_workers, executor)
+        uploaders = start_threads(upload_worker, upload_workers)
+
+        stop_threads(downloaders)
+        stop_threads(splitters, split_queue)
+        stop_threads(uploaders, upload_queue)
+
+    progress.close()
+    print(f"Peak disk use: {disk.peak / 1e6:.1f} MB, peak case PDF memory use: {memory.peak / 1e6:.1f} MB")
+    return results
+
+
+class ByteBudget:
+    """
+    Tracks the bytes held by volumes in flight, and holds back new volumes while they would exceed a limit
+    A limit of 0 means no limit; a volume larger than the limit is still admitted once nothing else is held
+    """
+
+    def __init__(self, limit=0):
+        self.limit = limit
+        self.in_flight = 0
+        self.peak = 0
+        self.condition = threading.Condition()
+
+    def acquire(self, size):
+        with self.condition:
+            self.condition.wait_for(
+                lambda: not self.limit or not self.in_flight or self.in_flight + size <= self.limit
+            )
+            self.add(size)
+
+    def add(self, size):
+        """
+        Counts bytes that are already held, without waiting for room
+        """
+        with self.condition:
+            self.in_flight += size
+            self.peak = max(self.peak, self.in_flight)
+
+    def release(self, size):
+        with self.condition:
+            self.in_flight -= size
+            self.condition.notify_all()
+
+
+def get_case_pdfs_sizes(case_pdfs):
+    """
+    Returns the bytes taken by case PDFs in memory and on disk
+    """
+    memory_size = sum(len(case_pdf) for _, case_pdf in case_pdfs if isinstance(case_pdf, bytes))
+    disk_size = sum(os.path.getsize(case_pdf) for _, case_pdf in case_pdfs if not isinstance(case_pdf, bytes))
+    return memory_size, disk_size
+
+
+def start_threads(target, count, *args):
+    threads = [threading.Thread(target=target, args=args, daemon=True) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def stop_threads(threads, work_queue=None):
+    """
+    Waits for a pipeline stage to finish, after telling its threads that no more work is coming
+    """
+    if work_queue is not None:
+        for _ in threads:
+            work_queue.put(STOP)
+    for thread in threads:
+        thread.join()
 
 
 def get_volumes_to_process(
@@ -76,6 +399,20 @@ def get_volumes_to_process(
             if v.get("publication_year") == int(publication_year)
         ]
 
+    # drop all-Fastcase volumes before making any per-volume request
+    case_sources_metadata = get_case_sources_metadata(r2_bucket)
+    if case_sources_metadata:
+        fastcase_only = {
+            (summary["reporter_slug"], summary["volume_folder"])
+            for summary in json.loads(case_sources_metadata)
+            if summary["fastcase_only"]
+        }
+        volume_count = len(volumes_metadata)
+        volumes_metadata = [
+            v for v in volumes_metadata if (v["reporter_slug"], v["volume_folder"]) not in fastcase_only
+        ]
+        print(f"Skipping {volume_count - len(volumes_metadata)} all-Fastcase volumes")
+
     return volumes_metadata
 
 
@@ -86,19 +423,12 @@ def get_cases_metadata(s3_client, bucket, volume):
     )
 
     try:
-        # Try to get metadata from zip file first
-        response = s3_client.get_object(Bucket=bucket, Key=zip_key)
-        with zipfile.ZipFile(io.BytesIO(response["Body"].read())) as zip_ref:
-            file_list = zip_ref.namelist()
-            metadata_file_name = next(
-                (name for name in file_list if name.endswith("CasesMetadata.json")),
-                None,
-            )
-            if metadata_file_name:
-                with zip_ref.open(metadata_file_name) as metadata_file:
-                    return json.load(metadata_file)
-            else:
-                print(f"CasesMetadata.json not found in zip file {zip_key}")
+        # Try to get metadata from zip file first, reading only the CasesMetadata.json member
+        metadata_file = get_zip_member(bucket, zip_key, "CasesMetadata.json", s3_client)
+        if metadata_file is not None:
+            return json.loads(metadata_file)
+        else:
+            print(f"CasesMetadata.json not found in zip file {zip_key}")
     except s3_client.exceptions.NoSuchKey:
         # If zip file doesn't exist, try unzipped file
         try:
@@ -112,40 +442,130 @@ def get_cases_metadata(s3_client, bucket, volume):
         return None
 
 
-def process_volume(volume, s3_client=production_s3_client):
+def prepare_volume(volume, s3_client=production_s3_client, force=False, disk=None):
+    """
+    Gets the cases metadata of a volume and downloads its PDF to a temp file
+    Uses the volume's split manifest to skip finished volumes, and the cases an interrupted run of the same inputs
+    already uploaded; case PDFs in the bucket that no such manifest lists are split again and overwritten
+    With a disk ByteBudget, room for the volume PDF is reserved just before downloading it, so skipped volumes
+    never wait for it; the caller releases it once the PDF is deleted
+    Returns None for volumes that don't need splitting
+    """
     cases_metadata = get_cases_metadata(s3_client, READ_BUCKET, volume)
 
     if not cases_metadata:
         print(f"Skipping volume {volume['volume_folder']} due to missing metadata")
         return
 
-    if not all([case["provenance"]["source"] == "Fastcase" for case in cases_metadata]):
-        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as temp_file:
-            pdf_path = temp_file.name
-            download_pdf(volume, pdf_path, s3_client)
-
-        try:
-            case_pdfs = split_pdf(pdf_path, cases_metadata)
-            print(f"Split {len(case_pdfs)} case PDFs")
-            if len(case_pdfs):
-                upload_case_pdfs(case_pdfs, volume, s3_client)
-            return f"Processed {len(case_pdfs)} cases for volume {volume['volume_folder']}"
-        except Exception as e:
-            print(
-                f"Error processing volume {volume['volume_folder']} of {volume['reporter_slug']}: {str(e)}"
-            )
-            return f"Error processing volume {volume['volume_folder']}: {str(e)}"
-        finally:
-            os.unlink(pdf_path)
-    else:
+    if all([case["provenance"]["source"] == "Fastcase" for case in cases_metadata]):
         print(f"Skipping all-Fastcase volume {volume['volume_folder']}")
         return
 
+    fingerprint = get_volume_fingerprint(volume, cases_metadata, s3_client)
+    manifest = None if force else get_split_manifest(volume, s3_client)
+    cases_to_split = [case for case in cases_metadata if case["provenance"]["source"] != "Fastcase"]
+    uploaded_case_pdfs = {}
+
+    if manifest and manifest["fingerprint"] == fingerprint:
+        if manifest["complete"]:
+            print(f"Skipping already split volume {volume['volume_folder']}")
+            return
+        # an earlier run of this same source was interrupted, only the cases it didn't record need splitting
+        uploaded_case_pdfs = {case["file_name"]: case for case in manifest["cases"]}
+        cases_to_split = [case for case in cases_to_split if case["file_name"] not in uploaded_case_pdfs]
+        if not cases_to_split:
+            put_split_manifest(volume, fingerprint, cases_metadata, uploaded_case_pdfs, s3_client)
+            print(f"Skipping already split volume {volume['volume_folder']}")
+            return
+    else:
+        put_split_manifest(volume, fingerprint, cases_metadata, uploaded_case_pdfs, s3_client)
+
+    if disk is not None:
+        disk.acquire(volume.get("pdf_size", 0))
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as temp_file:
+        pdf_path = temp_file.name
+    try:
+        download_pdf(volume, pdf_path, s3_client)
+    except Exception:
+        os.unlink(pdf_path)
+        if disk is not None:
+            disk.release(volume.get("pdf_size", 0))
+        raise
+
+    return {
+        "volume": volume,
+        "cases_metadata": cases_metadata,
+        "cases_to_split": cases_to_split,
+        "pdf_path": pdf_path,
+        "fingerprint": fingerprint,
+        "uploaded_case_pdfs": uploaded_case_pdfs,
+    }
+
+
+def get_volume_fingerprint(volume, cases_metadata, s3_client=production_s3_client):
+    """
+    Identifies the inputs a volume's case PDFs are split from: its cases metadata and the ETag of its PDF
+    The ETag is taken from the volume's listing when schedule_volumes has added it
+    """
+    source_pdf_etag = volume.get("pdf_etag")
+    if source_pdf_etag is None:
+        key = f"{volume['reporter_slug']}/{volume['volume_folder']}.pdf"
+        source_pdf_etag = s3_client.head_object(Bucket=READ_BUCKET, Key=key)["ETag"]
+    cases_metadata_hash = hashlib.sha256(json.dumps(cases_metadata, sort_keys=True).encode("utf-8")).hexdigest()
+
+    return {"cases_metadata_sha256": cases_metadata_hash, "source_pdf_etag": source_pdf_etag}
+
+
+def get_manifest_key(volume):
+    return f"{MANIFEST_PREFIX}{volume['reporter_slug']}/{volume['volume_folder']}.json"
+
+
+def get_split_manifest(volume, s3_client=production_s3_client):
+    """
+    Gets the split manifest of a volume, or None if it has never been split
+    """
+    try:
+        response = s3_client.get_object(Bucket=WRITE_BUCKET, Key=get_manifest_key(volume))
+        return json.loads(response["Body"].read().decode("utf-8"))
+    except s3_client.exceptions.NoSuchKey:
+        return None
+
+
+def put_split_manifest(volume, fingerprint, cases_metadata, uploaded_case_pdfs, s3_client=production_s3_client):
+    """
+    Writes the split manifest of a volume, listing the name, key, size and ETag of the case PDFs uploaded for these
+    inputs, from a dictionary of case file name to case PDF
+    The manifest is only marked complete once every case PDF is listed, so the next run picks up where this one stopped
+    Returns the case PDFs that are still missing
+    """
+    cases = []
+    missing = []
+
+    for case in cases_metadata:
+        if case["provenance"]["source"] == "Fastcase":
+            continue
+        if case["file_name"] in uploaded_case_pdfs:
+            cases.append(uploaded_case_pdfs[case["file_name"]])
+        else:
+            missing.append(case["file_name"])
+
+    manifest = {
+        "reporter_slug": volume["reporter_slug"],
+        "volume_folder": volume["volume_folder"],
+        "fingerprint": fingerprint,
+        "complete": not missing,
+        "cases": cases,
+    }
+    s3_client.put_object(Bucket=WRITE_BUCKET, Key=get_manifest_key(volume), Body=json.dumps(manifest),
+                         ContentType="application/json")
+
+    return missing
+
 
 def download_pdf(volume, local_path, s3_client=production_s3_client):
     key = f"{volume['reporter_slug']}/{volume['volume_folder']}.pdf"
     try:
-        s3_client.download_file(READ_BUCKET, key, local_path)
+        download_object(READ_BUCKET, key, local_path, s3_client)
     except Exception as e:
         print(
             f"Error downloading PDF for volume {volume['volume_folder']} of {volume['reporter_slug']}: {str(e)}"
@@ -153,7 +573,12 @@ def download_pdf(volume, local_path, s3_client=production_s3_client):
         raise
 
 
-def split_pdf(pdf_path, cases_metadata):
+def split_pdf(pdf_path, cases_metadata, spill_threshold=0):
+    """
+    Splits a volume PDF into case PDFs, written to in-memory buffers
+    Case PDFs larger than spill_threshold bytes are written to temp files instead, if spill_threshold is set
+    Returns (file name, bytes or temp file path) pairs
+    """
     reader = PdfReader(pdf_path)
 
     case_pdfs = []
@@ -166,22 +591,63 @@ def split_pdf(pdf_path, cases_metadata):
             for page_num in range(start_page, end_page):
                 writer.add_page(reader.pages[page_num])
 
-            with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as temp_case_file:
-                writer.write(temp_case_file)
-                case_pdfs.append((case["file_name"], temp_case_file.name))
+            buffer = io.BytesIO()
+            writer.write(buffer)
+            if spill_threshold and buffer.tell() > spill_threshold:
+                with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as temp_case_file:
+                    temp_case_file.write(buffer.getbuffer())
+                    case_pdfs.append((case["file_name"], temp_case_file.name))
+            else:
+                case_pdfs.append((case["file_name"], buffer.getvalue()))
 
     return case_pdfs
 
 
-def upload_case_pdfs(case_pdfs, volume, s3_client=production_s3_client):
-    for case_name, case_path in case_pdfs:
-        key = f"{volume['reporter_slug']}/{volume['volume_folder']}/case-pdfs/{case_name}.pdf"
-        try:
-            s3_client.upload_file(case_path, WRITE_BUCKET, key)
-            print(f"Uploaded {key} to {WRITE_BUCKET}")
-        except Exception as e:
-            print(
-                f"Error uploading case PDF {case_name} for volume {volume['volume_folder']} of {volume['reporter_slug']}: {str(e)}"
-            )
-        finally:
-            os.unlink(case_path)
+def upload_case_pdfs(case_pdfs, volume, s3_client=production_s3_client, executor=None):
+    """
+    Uploads case PDFs concurrently through one client, so the uploads share its connection pool
+    Pass a shared executor to bound the number of uploads in flight across volumes
+    Returns a dictionary of case file name to the key, size and ETag of each case PDF that was uploaded
+    """
+    if executor is None:
+        with ThreadPoolExecutor(max_workers=UPLOAD_CONCURRENCY) as executor:
+            return upload_case_pdfs(case_pdfs, volume, s3_client, executor)
+
+    futures = [
+        executor.submit(upload_case_pdf, case_name, case_pdf, volume, s3_client)
+        for case_name, case_pdf in case_pdfs
+    ]
+    uploaded_case_pdfs = {}
+    for future in as_completed(futures):
+        uploaded_case_pdf = future.result()
+        if uploaded_case_pdf:
+            uploaded_case_pdfs[uploaded_case_pdf["file_name"]] = uploaded_case_pdf
+
+    return uploaded_case_pdfs
+
+
+def upload_case_pdf(case_name, case_pdf, volume, s3_client=production_s3_client):
+    """
+    Uploads a case PDF from memory or a spilled temp file
+    Returns its file name, key, size and ETag, or None if the upload failed
+    """
+    key = f"{volume['reporter_slug']}/{volume['volume_folder']}/case-pdfs/{case_name}.pdf"
+    try:
+        if isinstance(case_pdf, bytes):
+            size = len(case_pdf)
+            etag = s3_client.put_object(Bucket=WRITE_BUCKET, Key=key, Body=case_pdf,
+                                        ContentType="application/pdf")["ETag"]
+        else:
+            size = os.path.getsize(case_pdf)
+            s3_client.upload_file(case_pdf, WRITE_BUCKET, key, ExtraArgs={"ContentType": "application/pdf"})
+            # upload_file doesn't return the ETag, which isn't the MD5 of the file when it uploads in parts
+            etag = s3_client.head_object(Bucket=WRITE_BUCKET, Key=key)["ETag"]
+        print(f"Uploaded {key} to {WRITE_BUCKET}")
+        return {"file_name": case_name, "key": key, "size": size, "etag": etag}
+    except Exception as e:
+        print(
+            f"Error uploading case PDF {case_name} for volume {volume['volume_folder']} of {volume['reporter_slug']}: {str(e)}"
+        )
+    finally:
+        if not isinstance(case_pdf, bytes):
+            os.unlink(case_pdf)
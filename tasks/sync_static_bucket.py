@@ -6,7 +6,8 @@ from invoke import task
 from .helpers import (
     get_volumes_metadata,
     write_paths_to_file,
-    s3_paginator,
+    list_objects_sharded,
+    s3_client,
     R2_STATIC_BUCKET,
     RCLONE_R2_CAP_STATIC_BASE_URL,
     S3_ARCHIVE_BUCKET,
@@ -85,37 +86,33 @@ def filter_for_newest_tars():
     """
     grouped_data = defaultdict(list)
 
-    for page in s3_paginator.paginate(Bucket=S3_ARCHIVE_BUCKET, Prefix=S3_CAPTAR_REDACTED_FOLDER,
-                                      PaginationConfig={"PageSize": 1000}):
-        for item in page["Contents"]:
-            volume_id = (item["Key"].split("/")[-1]).split("_redacted")[0]
-            ts_result = re.search(r"\d{4}_\d{2}_\d{2}_\d{2}\.\d{2}\.\d{2}", item["Key"])
-            timestamp = "1600" if ts_result is None else ts_result.group(0)
-            redacted = "redacted"
-            extension = item["Key"][item["Key"].index(".tar"):]
-            grouped_data[(volume_id, extension, redacted)].append({
-                "s3_key": item["Key"],
-                "volume_id": volume_id,
-                "redacted": redacted,
-                "extension": extension,
-                "timestamp": timestamp,
-            })
-
-    for page in s3_paginator.paginate(Bucket=S3_ARCHIVE_BUCKET, Prefix=S3_CAPTAR_UNREDACTED_FOLDER,
-                                      PaginationConfig={"PageSize": 1000}):
-        for item in page["Contents"]:
-            volume_id = (item["Key"].split("/")[-1]).split("_unredacted")[0]
-            ts_result = re.search(r"\d{4}_\d{2}_\d{2}_\d{2}\.\d{2}\.\d{2}", item["Key"])
-            timestamp = "1600" if ts_result is None else ts_result.group(0)
-            redacted = "unredacted"
-            extension = item["Key"][item["Key"].index(".tar"):]
-            grouped_data[(volume_id, extension, redacted)].append({
-                "s3_key": item["Key"],
-                "volume_id": volume_id,
-                "redacted": redacted,
-                "extension": extension,
-                "timestamp": timestamp,
-            })
+    for item in list_objects_sharded(S3_ARCHIVE_BUCKET, S3_CAPTAR_REDACTED_FOLDER, s3_client):
+        volume_id = (item["Key"].split("/")[-1]).split("_redacted")[0]
+        ts_result = re.search(r"\d{4}_\d{2}_\d{2}_\d{2}\.\d{2}\.\d{2}", item["Key"])
+        timestamp = "1600" if ts_result is None else ts_result.group(0)
+        redacted = "redacted"
+        extension = item["Key"][item["Key"].index(".tar"):]
+        grouped_data[(volume_id, extension, redacted)].append({
+            "s3_key": item["Key"],
+            "volume_id": volume_id,
+            "redacted": redacted,
+            "extension": extension,
+            "timestamp": timestamp,
+        })
+
+    for item in list_objects_sharded(S3_ARCHIVE_BUCKET, S3_CAPTAR_UNREDACTED_FOLDER, s3_client):
+        volume_id = (item["Key"].split("/")[-1]).split("_unredacted")[0]
+        ts_result = re.search(r"\d{4}_\d{2}_\d{2}_\d{2}\.\d{2}\.\d{2}", item["Key"])
+        timestamp = "1600" if ts_result is None else ts_result.group(0)
+        redacted = "unredacted"
+        extension = item["Key"][item["Key"].index(".tar"):]
+        grouped_data[(volume_id, extension, redacted)].append({
+            "s3_key": item["Key"],
+            "volume_id": volume_id,
+            "redacted": redacted,
+            "extension": extension,
+            "timestamp": timestamp,
+        })
 
     unique_items = []
 
@@ -132,15 +129,9 @@ def filter_for_newest_tars():
 def get_s3_files(bucket, path):
     """
     Creates a list of dictionaries for each volume pdf that are in the archive bucket
-    Pagination is needed as s3.list_objects_v2 can only return max 1000 records at a time
+    Sub-folders of the path are listed concurrently, as s3.list_objects_v2 can only return max 1000 records at a time
     """
-    s3_files = []
-
-    for page in s3_paginator.paginate(Bucket=bucket, Prefix=path, PaginationConfig={"PageSize": 1000}):
-        for item in page["Contents"]:
-            s3_files.append(item["Key"])
-
-    return s3_files
+    return [item["Key"] for item in list_objects_sharded(bucket, path, s3_client)]
 
 
 def get_volume_matches_for_pdfs(s3_files, volumes_metadata):
@@ -8,7 +8,8 @@ import pandas as pd
 from .helpers import (get_volumes_metadata, get_reporter_volumes_metadata, write_paths_to_file, write_volumes_to_file,
                       R2_STATIC_BUCKET, R2_UNREDACTED_BUCKET, S3_ARCHIVE_BUCKET, S3_PDF_FOLDER, S3_CAPTAR_UNREDACTED_FOLDER,
                       RCLONE_R2_UNREDACTED_BASE_URL, RCLONE_R2_CAP_STATIC_BASE_URL, RCLONE_S3_BASE_URL,
-                      s3_paginator, r2_paginator, r2_s3_client,
+                      s3_client, r2_s3_client, list_objects, list_objects_sharded, put_encoded_object,
+                      check_content_encoding,
                       OBJECT_PATHS_FILE, VOLUMES_TO_UNREDACT_FILE)
 
 
@@ -17,13 +18,12 @@ def pdf_paths(ctx, file_path=OBJECT_PATHS_FILE):
     """ Creates file path pairs to copy unredacted pdfs from S3 to r2 unredacted bucket. """
     volumes_metadata = json.loads(get_volumes_metadata())
     s3_files = {}
-    for page in s3_paginator.paginate(Bucket=S3_ARCHIVE_BUCKET, Prefix=S3_PDF_FOLDER, PaginationConfig={"PageSize": 1000}):
-        for item in page["Contents"]:
-            s3_files[f"{item['volume_id']}/{item['extension']}/"] = {
-                "s3_key": item["Key"],
-                "volume_id": (item["Key"].split("/")[-1]).split(".")[0],
-                "extension": ".pdf",
-            }
+    for item in list_objects_sharded(S3_ARCHIVE_BUCKET, S3_PDF_FOLDER, s3_client):
+        s3_files[f"{item['volume_id']}/{item['extension']}/"] = {
+            "s3_key": item["Key"],
+            "volume_id": (item["Key"].split("/")[-1]).split(".")[0],
+            "extension": ".pdf",
+        }
     volume_matches = get_volume_matches_for_artifacts(s3_files, volumes_metadata, ".pdf")
     write_paths_to_file(volume_matches, file_path)
 
@@ -63,14 +63,16 @@ def unredact_volumes(ctx, volume=None, reporter=None, publication_year=None):
 
 
 @task
-def update_volume_fields(ctx, dry_run=False):
+def update_volume_fields(ctx, dry_run=False, encoding=None):
     """
     Invoked with `invoke unredact.update-volume-fields`
     The output of the unredact-volumes task is used to decide which volumes need updating.
     Updates the `redacted` fields in top level and reporter level VolumesMetadata.json files.
     Updates the `last_updated` fields in top level and reporter level VolumesMetadata.json files.
     If dry-run is passed, won't update the files.
+    If encoding (gzip or br) is passed, the files are uploaded compressed, with that Content-Encoding.
     """
+    check_content_encoding(encoding)
     with open(VOLUMES_TO_UNREDACT_FILE, 'r') as volumes_file:
         if not bool(volumes_file.readlines()):
             raise Exception(f"Couldn't find any volumes in file.")
@@ -98,8 +100,8 @@ def update_volume_fields(ctx, dry_run=False):
         # upload the new top level VolumesMetadata.json
         if not dry_run:
             print("Updating top level VolumesMetadata.json")
-            r2_s3_client.put_object(Bucket=R2_STATIC_BUCKET, Body=json.dumps(volumes_metadata),
-                                    Key="VolumesMetadata.json", ContentType="application/json")
+            put_encoded_object(R2_STATIC_BUCKET, "VolumesMetadata.json", json.dumps(volumes_metadata).encode("utf-8"),
+                               "application/json", encoding, r2_s3_client)
 
         ### update the reporter level volumes metadata fields ###
 
@@ -118,17 +120,20 @@ def update_volume_fields(ctx, dry_run=False):
             # upload the new reporter level VolumesMetadata.json
             if not dry_run:
                 print(f"Updating reporter level VolumesMetadata.json for reporter {reporter}")
-                r2_s3_client.put_object(Bucket=R2_STATIC_BUCKET, Body=json.dumps(reporter_volumes_metadata),
-                                        Key=f"{reporter}/VolumesMetadata.json", ContentType="application/json")
+                put_encoded_object(R2_STATIC_BUCKET, f"{reporter}/VolumesMetadata.json",
+                                   json.dumps(reporter_volumes_metadata).encode("utf-8"), "application/json", encoding,
+                                   r2_s3_client)
 
 
 
 @task
-def add_last_updated_field(ctx, dry_run=False):
+def add_last_updated_field(ctx, dry_run=False, encoding=None):
     """
     Adds last_updated field to all volumes in VolumesMetadata.json files.
     If dry-run is passed, only prints what would be updated.
+    If encoding (gzip or br) is passed, the files are uploaded compressed, with that Content-Encoding.
     """
+    check_content_encoding(encoding)
     current_time = datetime.now(timezone.utc).isoformat()
 
     # Update main VolumesMetadata.json
@@ -143,8 +148,8 @@ def add_last_updated_field(ctx, dry_run=False):
     print(f"Would update {updated_count} volumes in main VolumesMetadata.json")
 
     if not dry_run:
-        r2_s3_client.put_object(Bucket=R2_STATIC_BUCKET, Body=json.dumps(volumes_metadata), Key="VolumesMetadata.json",
-                                ContentType="application/json")
+        put_encoded_object(R2_STATIC_BUCKET, "VolumesMetadata.json", json.dumps(volumes_metadata).encode("utf-8"),
+                           "application/json", encoding, r2_s3_client)
         print("Updated main VolumesMetadata.json")
 
     # Update reporter-specific metadata files
@@ -163,8 +168,9 @@ def add_last_updated_field(ctx, dry_run=False):
             print(f"Would update {reporter_updated_count} volumes in {reporter}/VolumesMetadata.json")
 
             if not dry_run:
-                r2_s3_client.put_object(Bucket=R2_STATIC_BUCKET, Body=json.dumps(reporter_metadata),
-                                        Key=f"{reporter}/VolumesMetadata.json", ContentType="application/json")
+                put_encoded_object(R2_STATIC_BUCKET, f"{reporter}/VolumesMetadata.json",
+                                   json.dumps(reporter_metadata).encode("utf-8"), "application/json", encoding,
+                                   r2_s3_client)
                 print(f"Updated {reporter}/VolumesMetadata.json")
 
         except Exception as e:
@@ -246,21 +252,8 @@ def get_unredacted_volume_files(volume):
     volume_files = []
 
     # grab the volume artifacts
-    for page in r2_paginator.paginate(Bucket=R2_UNREDACTED_BUCKET, Prefix=f"{key_prefix}.",
-                                      PaginationConfig={"PageSize": 1000}):
-        for item in page["Contents"]:
-            if any(ext in item["Key"] for ext in extensions):
-                volume_files.append(
-                    {
-                        "source": f"{RCLONE_R2_UNREDACTED_BASE_URL}{item['Key']}",
-                        "destination": f"{RCLONE_R2_CAP_STATIC_BASE_URL}{item['Key']}",
-                    }
-                )
-
-    # grab the volume case and metadata files
-    for page in r2_paginator.paginate(Bucket=R2_UNREDACTED_BUCKET, Prefix=f"{key_prefix}/",
-                                      PaginationConfig={"PageSize": 1000}):
-        for item in page["Contents"]:
+    for item in list_objects(R2_UNREDACTED_BUCKET, f"{key_prefix}.", use_inventory=True):
+        if any(ext in item["Key"] for ext in extensions):
             volume_files.append(
                 {
                     "source": f"{RCLONE_R2_UNREDACTED_BASE_URL}{item['Key']}",
@@ -268,6 +261,15 @@ def get_unredacted_volume_files(volume):
                 }
             )
 
+    # grab the volume case and metadata files
+    for item in list_objects(R2_UNREDACTED_BUCKET, f"{key_prefix}/", use_inventory=True):
+        volume_files.append(
+            {
+                "source": f"{RCLONE_R2_UNREDACTED_BASE_URL}{item['Key']}",
+                "destination": f"{RCLONE_R2_CAP_STATIC_BASE_URL}{item['Key']}",
+            }
+        )
+
     return volume_files
 
 
@@ -303,17 +305,16 @@ def filter_for_newest_tars():
     """
     grouped_data = defaultdict(list)
 
-    for page in s3_paginator.paginate(Bucket=S3_ARCHIVE_BUCKET, Prefix=S3_CAPTAR_UNREDACTED_FOLDER, PaginationConfig={"PageSize": 1000}):
-        for item in page["Contents"]:
-            volume_id = (item["Key"].split("/")[-1]).split("_unredacted")[0]
-            ts_result = re.search(r"\d{4}_\d{2}_\d{2}_\d{2}\.\d{2}\.\d{2}", item["Key"])
-            timestamp = "1600" if ts_result is None else ts_result.group(0)
-            grouped_data[(item["volume_id"], item["extension"])].append({
-                "s3_key": item["Key"],
-                "volume_id": volume_id,
-                "extension": item["Key"][item["Key"].index(".tar"):],
-                "timestamp": timestamp,
-            })
+    for item in list_objects_sharded(S3_ARCHIVE_BUCKET, S3_CAPTAR_UNREDACTED_FOLDER, s3_client):
+        volume_id = (item["Key"].split("/")[-1]).split("_unredacted")[0]
+        ts_result = re.search(r"\d{4}_\d{2}_\d{2}_\d{2}\.\d{2}\.\d{2}", item["Key"])
+        timestamp = "1600" if ts_result is None else ts_result.group(0)
+        grouped_data[(item["volume_id"], item["extension"])].append({
+            "s3_key": item["Key"],
+            "volume_id": volume_id,
+            "extension": item["Key"][item["Key"].index(".tar"):],
+            "timestamp": timestamp,
+        })
 
     unique_items = []
 
@@ -1,82 +1,217 @@
 import concurrent.futures
-import io
+import hashlib
 import json
 import threading
-import zipfile
+import time
 
 from botocore.exceptions import ClientError
 from invoke import task
 
-from .helpers import get_volumes_metadata, r2_s3_client, r2_paginator
+from .helpers import (
+    get_volumes_metadata,
+    read_object,
+    compress_zip_entry,
+    create_zip_index,
+    get_zip_index_key,
+    is_index_file,
+    list_objects,
+    r2_s3_client,
+    MultipartUploadWriter,
+    ZipStreamWriter,
+)
 
 zip_lock = threading.Lock()
 
+# volumes zipped at the same time, and GETs in flight across all of them
+VOLUMES_IN_FLIGHT = 4
+FETCH_WORKERS = 32
+# files of a volume fetched ahead of the next one to write to its zip, bounding the entries held back for ordering
+ENTRIES_AHEAD = 2 * FETCH_WORKERS
+
+# fixed entry timestamps and compression settings, so the same files always produce the same zip
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+ZIP_COMPRESSION_LEVEL = 6
+
 
 @task
-def zip_volumes(ctx, r2_bucket):
+def zip_volumes(ctx, r2_bucket, volumes_in_flight=VOLUMES_IN_FLIGHT, fetch_workers=FETCH_WORKERS, incremental=False):
     """ Downloads data for each volume from r2, zips, and uploads. """
     volumes = json.loads(get_volumes_metadata(r2_bucket))
     volume_counter = 0
-
-    for volume in volumes:
-        # fetch files for volume
-        reporter = volume["reporter_slug"]
-        volume = volume["volume_folder"]
-        json_files = get_case_files_of_volume(reporter, volume, "json", r2_bucket)
-        html_files = get_case_files_of_volume(reporter, volume, "html", r2_bucket)
-        metadata_files = [
-            f"{reporter}/{volume}/VolumeMetadata.json",
-            f"{reporter}/{volume}/CasesMetadata.json",
+    skipped_counter = 0
+    failed_counter = 0
+    fetched_bytes = 0
+    start_time = time.monotonic()
+
+    # one long-lived fetch pool is shared by every volume in flight, bounding the total number of GETs
+    with (
+        concurrent.futures.ThreadPoolExecutor(max_workers=fetch_workers) as fetch_executor,
+        concurrent.futures.ThreadPoolExecutor(max_workers=volumes_in_flight) as volume_executor,
+    ):
+        futures = [
+            volume_executor.submit(zip_volume, volume["reporter_slug"], volume["volume_folder"], r2_bucket,
+                                   fetch_executor, incremental)
+            for volume in volumes
         ]
-        files = json_files + html_files + metadata_files
-
-        # write files to zip buffer
-        bytes_io = io.BytesIO()
-        with zipfile.ZipFile(bytes_io, "a", zipfile.ZIP_DEFLATED) as zip_file:
-            with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-                file_folder_pairs = [(file, get_folder(file)) for file in files]
-                futures = [
-                    executor.submit(fetch_and_write_to_zip, zip_file, file, folder, r2_bucket)
-                    for file, folder in file_folder_pairs
-                ]
+        for future in concurrent.futures.as_completed(futures):
+            if future.exception() is not None:
+                failed_counter += 1
+            elif future.result() is None:
+                skipped_counter += 1
+            else:
+                fetched_bytes += future.result()
+            volume_counter += 1
+            elapsed = time.monotonic() - start_time
+            print(f"{volume_counter}/{len(volumes)} were processed, {skipped_counter} unchanged, "
+                  f"{failed_counter} failed ({volume_counter / elapsed * 60:.1f} volumes/min, "
+                  f"{fetched_bytes / elapsed / 1e6:.1f} MB/s)")
+
+
+def zip_volume(reporter, volume, r2_bucket, fetch_executor, incremental=False, entries_ahead=ENTRIES_AHEAD):
+    """
+    Fetches the files of a volume on the shared fetch pool, zips, and uploads, along with the zip's range index
+    The zip is tagged with a fingerprint of its source files; in incremental mode, volumes whose existing zip has
+    a matching fingerprint are skipped
+    At most entries_ahead files are fetched or held back beyond the next entry to write, so one slow GET doesn't
+    leave the rest of the volume buffered in memory
+    If a file can't be fetched or the upload fails, neither the zip nor its index is written, and the error is raised
+    Returns the number of bytes fetched, or None if the volume was skipped
+    """
+    json_files = get_case_files_of_volume(reporter, volume, "json", r2_bucket)
+    html_files = get_case_files_of_volume(reporter, volume, "html", r2_bucket)
+    metadata_files = get_metadata_files_of_volume(reporter, volume, r2_bucket)
+    sources = json_files | html_files | metadata_files
+    files = sorted(json_files) + sorted(html_files) + sorted(metadata_files)
+    futures = []
+
+    file_name = f"{reporter}/{volume}.zip"
+    fingerprint = get_source_fingerprint(sources)
+    existing_zip = get_zip_object(file_name, r2_bucket)
+    if incremental and existing_zip and existing_zip["Metadata"].get("source-fingerprint") == fingerprint:
+        print(f"Skipping unchanged volume {file_name}")
+        return None
+
+    # stream the zip into a multipart upload, so parts upload while later files are still being fetched
+    # entries are written in the order of files, and an upload that would reproduce the existing zip is dropped
+    try:
+        with MultipartUploadWriter(r2_bucket, file_name, r2_s3_client,
+                                   skip_if_etag=existing_zip["ETag"] if existing_zip else None,
+                                   Metadata={"source-fingerprint": fingerprint}) as upload:
+            # a slot is taken for each file submitted and given back once its entry is written, or its fetch fails
+            window = threading.Semaphore(entries_ahead)
+            failed = threading.Event()
+
+            def release_failed_fetch(future):
+                if future.exception() is not None:
+                    failed.set()
+                    window.release()
+
+            with ZipStreamWriter(upload, on_write=lambda entry: window.release()) as zip_file:
+                volume_lock = threading.Lock()
+                for index, file in enumerate(files):
+                    window.acquire()
+                    # entries after a failed one are never written, so stop submitting
+                    if failed.is_set():
+                        break
+                    future = fetch_executor.submit(fetch_and_write_to_zip, zip_file, file, get_folder(file),
+                                                   r2_bucket, volume_lock, index)
+                    future.add_done_callback(release_failed_fetch)
+                    futures.append(future)
                 concurrent.futures.wait(futures)
-        volume_zip = bytes_io.getvalue()
-
-        # upload zip
-        file_name = f"{reporter}/{volume}.zip"
-        try:
-            r2_s3_client.upload_fileobj(io.BytesIO(volume_zip), r2_bucket, file_name)
-        except ClientError as e:
-            print(f"File upload error for: {file_name}: {e}")
+                # leaving the with blocks with an error aborts the upload, so a partial zip is never published
+                for future in futures:
+                    if future.exception() is not None:
+                        raise future.exception()
+        if upload.skipped:
+            print(f"Zip is identical to the existing one, skipped upload for: {file_name}")
+        upload_zip_index(file_name, create_zip_index(zip_file.entries, upload.etag, upload.tell()), r2_bucket)
+    except Exception as e:
+        print(f"Failed to zip {file_name}: {e}")
+        raise
 
-        volume_counter += 1
-        print(f"{volume_counter}/{len(volumes)} were processed")
+    return sum(future.result() for future in futures)
 
 
 def get_case_files_of_volume(reporter, volume, file_type, bucket):
     """
     Gets json and html files of a volume
+    Lists the bucket rather than an inventory snapshot, which would hide files changed or added since it was taken
+    Returns a dictionary of key to ETag
     """
     prefix = create_prefix(reporter, volume, file_type)
-    files_for_volumes = []
+    files_for_volumes = {}
 
-    for page in r2_paginator.paginate(Bucket=bucket, Prefix=prefix, PaginationConfig={"PageSize": 1000}):
-        for item in page["Contents"]:
-            if "/index.html" not in item["Key"]:
-                files_for_volumes.append(item["Key"])
+    for item in list_objects(bucket, prefix, s3_client=r2_s3_client):
+        if not is_index_file(item["Key"]):
+            files_for_volumes[item["Key"]] = item["ETag"]
 
     return files_for_volumes
 
 
-def fetch_and_write_to_zip(zip_file, file, folder, bucket):
+def get_metadata_files_of_volume(reporter, volume, bucket):
+    """
+    Gets the VolumeMetadata.json and CasesMetadata.json files of a volume
+    Lists with a delimiter, so only the files at the top of the volume folder are returned
+    Returns a dictionary of key to ETag
+    """
+    metadata_files = [
+        f"{reporter}/{volume}/VolumeMetadata.json",
+        f"{reporter}/{volume}/CasesMetadata.json",
+    ]
+    files = {}
+
+    for item in list_objects(bucket, f"{reporter}/{volume}/", delimiter="/", s3_client=r2_s3_client):
+        if item["Key"] in metadata_files:
+            files[item["Key"]] = item["ETag"]
+
+    return files
+
+
+def get_source_fingerprint(sources):
+    """
+    Hashes the keys and ETags of a volume's source files, so any added, removed or edited file changes it
+    """
+    lines = "\n".join(f"{key} {etag}" for key, etag in sorted(sources.items()))
+    return hashlib.sha256(lines.encode("utf-8")).hexdigest()
+
+
+def get_zip_object(file_name, bucket):
+    """
+    Gets the ETag and metadata of an existing volume zip, or None if there isn't one
+    """
+    try:
+        return r2_s3_client.head_object(Bucket=bucket, Key=file_name)
+    except ClientError:
+        return None
+
+
+def upload_zip_index(file_name, zip_index, bucket):
+    """
+    Uploads the range index of a volume zip next to it, unless the existing index is identical
+    """
+    index_key = get_zip_index_key(file_name)
+    existing_index = get_zip_object(index_key, bucket)
+    with MultipartUploadWriter(bucket, index_key, r2_s3_client,
+                               skip_if_etag=existing_index["ETag"] if existing_index else None,
+                               ContentType="application/json") as upload:
+        upload.write(json.dumps(zip_index).encode("utf-8"))
+
+
+def fetch_and_write_to_zip(zip_file, file, folder, bucket, lock=zip_lock, index=None):
     """
     Fetches file content from R2 and writes to zip file
+    The content is compressed in the calling thread, so only appending the compressed bytes happens under the lock
+    With an index, the entry is written at that position in the zip, whenever its fetch finishes
+    Returns the number of bytes fetched
     """
-    content = r2_s3_client.get_object(Bucket=bucket, Key=file)["Body"].read()
+    content = read_object(bucket, file, r2_s3_client)
     file_name = file.split("/")[-1]
+    entry = compress_zip_entry(f"{folder}/{file_name}", content, ZIP_DATE_TIME, ZIP_COMPRESSION_LEVEL)
+
+    with lock:
+        zip_file.add_entry(entry, index)
 
-    with zip_lock:
-        zip_file.writestr(f"{folder}/{file_name}", content)
+    return len(content)
 
 
 def get_folder(file):
@@ -0,0 +1,295 @@
+import gzip
+import json
+import os
+from datetime import datetime, timezone
+from functools import partial
+from unittest.mock import patch
+
+import pytest
+from invoke.context import MockContext
+
+from tasks.helpers import list_objects, create_inventory, is_inventory_fresh, R2_STATIC_BUCKET
+from tasks.create_index_html import (
+    create_html,
+    create_artifact_index,
+    create_artifacts_html,
+    create_root_level_html,
+    create_reporter_level_html,
+    get_volume_files,
+    convert_sizes,
+    convert_times,
+    get_mtimes,
+    publish_html,
+    render_html,
+    select_volumes,
+    upload_index_page,
+)
+
+
+def make_items(keys):
+    return [{"Key": key, "Size": len(key)} for key in keys]
+
+
+def test_create_artifact_index():
+    items = make_items([
+        "a2d/1.pdf", "a2d/1.tar.csv", "a2d/1.zip", "a2d/1/cases/0001-01.json", "a2d/1/case-pdfs/0001-01.pdf",
+        "a2d/11.tar", "a2d/11.tar.sha256", "a2d/81-12.pdf", "a2d/VolumesMetadata.json",
+    ])
+
+    assert create_artifact_index(items, "a2d") == {
+        "1": {"pdf": 9, "tar.csv": 13},
+        "11": {"tar": 10, "tar.sha256": 17},
+        "81-12": {"pdf": 13},
+    }
+
+
+def test_create_artifacts_html():
+    reporter_artifacts = create_artifact_index(make_items(["a2d/1.pdf", "a2d/1.tar.csv"]), "a2d")
+
+    with patch("tasks.create_index_html.CAP_STATIC_BASE_URL", "https://static.case.law/"):
+        html = create_artifacts_html(reporter_artifacts, "a2d", "1")
+        assert html == ("<td><a href='https://static.case.law/a2d/1.pdf'>1.pdf</a></td><td></td>"
+                        "<td><a href='https://static.case.law/a2d/1.tar.csv'>1.tar.csv</a></td><td></td>")
+        assert create_artifacts_html(reporter_artifacts, "a2d", "2") == "<td></td>" * 4
+
+
+def test_create_root_level_html():
+    with patch("tasks.create_index_html.CAP_STATIC_BASE_URL", "https://static.case.law/"):
+        html = create_root_level_html([{"slug": "a2d"}])
+
+    assert html.startswith("<style>") and html.endswith("</table>")
+    assert html[html.index("<table>"):] == (
+        "<table><tr><th>Contents</th></tr>"
+        "<tr><td><a href='https://static.case.law/a2d/'>a2d</a></td></tr>"
+        "<tr><td><a href='https://static.case.law/ReportersMetadata.json'>ReportersMetadata.json</a></td></tr>"
+        "<tr><td><a href='https://static.case.law/VolumesMetadata.json'>VolumesMetadata.json</a></td></tr>"
+        "<tr><td><a href='https://static.case.law/JurisdictionsMetadata.json'>JurisdictionsMetadata.json</a></td></tr>"
+        "</table>"
+    )
+
+
+def test_create_reporter_level_html_lists_reporter_once():
+    items = make_items(["a2d/1.pdf", "a2d/2.tar", "a2d/10.pdf"])
+
+    with patch("tasks.create_index_html.list_objects", return_value=items) as mock_list_objects:
+        html = create_reporter_level_html({"reporter_slug": "a2d", "volume_folder": ["10", "2", "1"]})
+
+    mock_list_objects.assert_called_once_with(R2_STATIC_BUCKET, "a2d/", delimiter="/", use_inventory=True)
+    assert html.index("1.pdf") < html.index("2.tar") < html.index("10.pdf")
+
+
+@pytest.fixture
+def static_bucket(s3_client):
+    """
+    Uploads the files of two small volumes, and patches create_index_html to use the mocked bucket
+    """
+    volumes = [{"reporter_slug": "a2d", "volume_folder": "1"}, {"reporter_slug": "a2d", "volume_folder": "2"}]
+    for key in ["a2d/1/CasesMetadata.json", "a2d/1/VolumeMetadata.json", "a2d/1/cases/0001-01.json",
+                "a2d/1/cases/0005-01.json", "a2d/1/html/0001-01.html", "a2d/1/html/index.html",
+                "a2d/2/cases/0001-01.json"]:
+        s3_client.put_object(Bucket=R2_STATIC_BUCKET, Key=key, Body=b"x" * 2048)
+
+    with (
+        patch("tasks.create_index_html.r2_s3_client", s3_client),
+        patch("tasks.create_index_html.list_objects", partial(list_objects, s3_client=s3_client)),
+        patch("tasks.create_index_html.get_volumes_metadata", return_value=json.dumps(volumes)),
+        patch("tasks.create_index_html.CAP_STATIC_BASE_URL", "https://static.case.law/"),
+    ):
+        yield volumes
+
+
+def get_page(s3_client, key):
+    return s3_client.get_object(Bucket=R2_STATIC_BUCKET, Key=key)["Body"].read().decode("utf-8")
+
+
+def test_get_volume_files_one_volume_at_a_time(static_bucket):
+    volume_files = get_volume_files(static_bucket)
+
+    files = next(volume_files)
+    assert files["key"] == [
+        "a2d/1/CasesMetadata.json", "a2d/1/VolumeMetadata.json", "a2d/1/cases/0001-01.json",
+        "a2d/1/cases/0005-01.json", "a2d/1/html/0001-01.html",
+    ]
+    assert files["file_size"] == ["2.0 KB"] * 5 and files["size"] == [2048] * 5
+    assert len(files["last_modified"]) == len(files["mtime"]) == 5
+    assert next(volume_files)["key"] == ["a2d/2/cases/0001-01.json"]
+    with pytest.raises(StopIteration):
+        next(volume_files)
+
+
+def test_convert_listing_columns():
+    times = [
+        datetime(2024, 3, 10, 6, 59, 59, tzinfo=timezone.utc),
+        datetime(2024, 3, 10, 7, 0, 0, tzinfo=timezone.utc),
+        datetime(2024, 11, 3, 5, 30, 0, 250000, tzinfo=timezone.utc),
+        datetime(2024, 11, 3, 6, 30, 0, tzinfo=timezone.utc),
+    ]
+
+    # either side of the spring forward and fall back transitions, whole seconds only
+    assert convert_times(times) == [
+        "03/10/2024 01:59:59", "03/10/2024 03:00:00", "11/03/2024 01:30:00", "11/03/2024 01:30:00",
+    ]
+    assert get_mtimes(times[2:3]) == ["2024-11-03T05:30:00+00:00"]
+    assert convert_sizes([2048, 1500, 1536, 0, 1234567]) == ["2.0 KB", "1.46 KB", "1.5 KB", "0.0 KB", "1205.63 KB"]
+    assert convert_sizes([1500]) == [f"{round(1500 / 1024, 2)} KB"]
+
+
+def test_create_volume_level_html(s3_client, static_bucket):
+    create_html(MockContext(), level="volume")
+
+    volume_page = get_page(s3_client, "a2d/1/index.html")
+    # cases and html folders first, then the metadata files
+    positions = [volume_page.index(f">{location}</a>")
+                 for location in ["html", "cases", "VolumeMetadata.json", "CasesMetadata.json"]]
+    assert positions == sorted(positions)
+    assert "href='https://static.case.law/a2d/1/cases/'" in volume_page
+
+    cases_page = get_page(s3_client, "a2d/1/cases/index.html")
+    assert cases_page.count("<tr><td>") == 2
+    assert "<td>2.0 KB</td>" in cases_page
+    assert ">0005-01.json</a>" in cases_page
+
+    html_page = get_page(s3_client, "a2d/1/html/index.html")
+    assert ">0001-01.html</a>" in html_page and ">index.html</a>" not in html_page
+    assert get_page(s3_client, "a2d/2/cases/index.html").count("<tr><td>") == 1
+    assert "Contents" not in s3_client.list_objects_v2(Bucket=R2_STATIC_BUCKET, Prefix="a2d/2/html/")
+
+
+def test_paginated_volume_level_html(s3_client, static_bucket, tmp_path):
+    create_html(MockContext(), level="volume", page_size=1)
+
+    first_page = get_page(s3_client, "a2d/1/cases/index.html")
+    assert ">0001-01.json</a>" in first_page and ">0005-01.json</a>" not in first_page
+    assert "<p>Page 1 of 2 | <a href='https://static.case.law/a2d/1/cases/index-2.html'>Next</a></p>" in first_page
+    second_page = get_page(s3_client, "a2d/1/cases/index-2.html")
+    assert ">0005-01.json</a>" in second_page
+    assert "<p><a href='https://static.case.law/a2d/1/cases/index.html'>Previous</a> | Page 2 of 2</p>" in second_page
+    assert "<p>" not in get_page(s3_client, "a2d/2/cases/index.html")
+
+    cases_index = json.loads(get_page(s3_client, "a2d/1/cases/index.json"))
+    assert [(entry["name"], entry["size"]) for entry in cases_index] == [("0001-01.json", 2048), ("0005-01.json", 2048)]
+    assert cases_index[0]["mtime"].endswith("+00:00")
+    volume_index = json.loads(get_page(s3_client, "a2d/1/index.json"))
+    assert [(entry["name"], entry["size"]) for entry in volume_index] == [
+        ("CasesMetadata.json", 2048), ("VolumeMetadata.json", 2048), ("cases/", None), ("html/", None),
+    ]
+    assert s3_client.head_object(Bucket=R2_STATIC_BUCKET, Key="a2d/1/index.json")["ContentType"] == "application/json"
+
+    # the listing pages are not listed as volume files on the next run
+    files = next(get_volume_files(static_bucket))
+    assert not any(key.endswith(("index-2.html", "index.json")) for key in files["key"])
+
+    # pages past the new page count are deleted once a folder is back on one page
+    create_html(MockContext(), level="volume", incremental=True, state_file=str(tmp_path / "state.json"))
+    assert ">0005-01.json</a>" in get_page(s3_client, "a2d/1/cases/index.html")
+    assert "Contents" not in s3_client.list_objects_v2(Bucket=R2_STATIC_BUCKET, Prefix="a2d/1/cases/index-")
+    assert "Contents" not in s3_client.list_objects_v2(Bucket=R2_STATIC_BUCKET, Prefix="a2d/1/html/index-")
+
+
+def test_unchanged_index_pages_are_not_uploaded(s3_client, static_bucket, capsys):
+    create_html(MockContext(), level="volume")
+    assert "10 of 10 index files were uploaded" in capsys.readouterr().out
+
+    with patch.object(s3_client, "put_object", wraps=s3_client.put_object) as mock_put_object:
+        create_html(MockContext(), level="volume")
+    mock_put_object.assert_not_called()
+
+    s3_client.put_object(Bucket=R2_STATIC_BUCKET, Key="a2d/2/cases/0001-01.json", Body=b"x")
+    with patch.object(s3_client, "put_object", wraps=s3_client.put_object) as mock_put_object:
+        create_html(MockContext(), level="volume")
+    assert {call.kwargs["Key"] for call in mock_put_object.call_args_list} == {
+        "a2d/2/cases/index.html", "a2d/2/cases/index.json"
+    }
+
+
+def test_unchanged_check_ignores_inventory_snapshot(s3_client, static_bucket, tmp_path):
+    with patch("tasks.helpers.INVENTORY_DIR", str(tmp_path)):
+        upload_index_page("a2d/index.html", b"<table>old</table>")
+        create_inventory(R2_STATIC_BUCKET, s3_client)
+        assert is_inventory_fresh(R2_STATIC_BUCKET)
+        upload_index_page("a2d/index.html", b"<table>new</table>")
+
+        # the page is back to its content when the snapshot was taken, but the bucket has the newer one
+        assert upload_index_page("a2d/index.html", b"<table>old</table>") is True
+        assert upload_index_page("a2d/index.html", b"<table>old</table>") is False
+    assert get_page(s3_client, "a2d/index.html") == "<table>old</table>"
+
+
+def test_incremental_volume_level_html(s3_client, static_bucket, tmp_path, capsys):
+    state_file = str(tmp_path / "state.json")
+    create_html(MockContext(), level="volume", incremental=True, state_file=state_file)
+    assert "10 of 10 index files were uploaded" in capsys.readouterr().out
+    with open(state_file) as file:
+        assert len(json.load(file)) == 10
+
+    # nothing changed, so nothing is rendered or checked
+    with patch.object(s3_client, "head_object", wraps=s3_client.head_object) as mock_head_object:
+        create_html(MockContext(), level="volume", incremental=True, state_file=state_file)
+    mock_head_object.assert_not_called()
+
+    s3_client.put_object(Bucket=R2_STATIC_BUCKET, Key="a2d/1/html/0005-01.html", Body=b"x")
+    with patch.object(s3_client, "put_object", wraps=s3_client.put_object) as mock_put_object:
+        create_html(MockContext(), level="volume", incremental=True, volumes="a2d/1", state_file=state_file)
+    assert {call.kwargs["Key"] for call in mock_put_object.call_args_list} == {
+        "a2d/1/html/index.html", "a2d/1/html/index.json"
+    }
+    assert "2 of 2 index files were uploaded" in capsys.readouterr().out
+
+    # switching encodings uploads every page again, compressed
+    create_html(MockContext(), level="volume", incremental=True, encoding="gzip", state_file=state_file)
+    assert "10 of 10 index files were uploaded" in capsys.readouterr().out
+    assert s3_client.head_object(Bucket=R2_STATIC_BUCKET, Key="a2d/1/index.html")["ContentEncoding"] == "gzip"
+
+
+@pytest.mark.parametrize("output", ["site", "site.tar.gz"])
+def test_render_and_publish_html(s3_client, static_bucket, tmp_path, capsys, output):
+    output = str(tmp_path / output)
+    with (
+        patch("tasks.create_index_html.get_reporters_metadata", return_value=json.dumps([{"slug": "a2d"}])),
+        patch.object(s3_client, "put_object", wraps=s3_client.put_object) as mock_put_object,
+    ):
+        render_html(MockContext(), output, processes=0)
+    # rendering alone uploads nothing
+    mock_put_object.assert_not_called()
+    assert "12 index files" in capsys.readouterr().out
+
+    publish_html(MockContext(), output)
+    assert "12 of 12 index files were uploaded" in capsys.readouterr().out
+    assert ">a2d</a>" in get_page(s3_client, "index.html")
+    assert ">2</a>" in get_page(s3_client, "a2d/index.html")
+    assert ">0005-01.json</a>" in get_page(s3_client, "a2d/1/cases/index.html")
+
+    publish_html(MockContext(), output)
+    assert "0 of 12 index files were uploaded" in capsys.readouterr().out
+
+
+def test_publish_html_precompressed(s3_client, static_bucket, tmp_path, capsys):
+    output = str(tmp_path / "site")
+    with patch("tasks.create_index_html.get_reporters_metadata", return_value=json.dumps([{"slug": "a2d"}])):
+        render_html(MockContext(), output, processes=0)
+
+    publish_html(MockContext(), output, encoding="gzip", processes=0)
+    assert "12 of 12 index files were uploaded" in capsys.readouterr().out
+    response = s3_client.get_object(Bucket=R2_STATIC_BUCKET, Key="a2d/1/cases/index.html")
+    assert response["ContentEncoding"] == "gzip" and response["ContentType"] == "text/html"
+    with open(os.path.join(output, "a2d", "1", "cases", "index.html"), "rb") as file:
+        assert gzip.decompress(response["Body"].read()) == file.read()
+
+    publish_html(MockContext(), output, encoding="gzip", processes=0)
+    assert "0 of 12 index files were uploaded" in capsys.readouterr().out
+
+
+def test_select_volumes():
+    volumes = [
+        {"reporter_slug": "a2d", "volume_folder": "1", "last_updated": "2024-01-01T00:00:00+00:00"},
+        {"reporter_slug": "a2d", "volume_folder": "2", "last_updated": "2024-06-01T12:00:00+00:00"},
+        {"reporter_slug": "cal", "volume_folder": "1"},
+    ]
+
+    assert select_volumes(volumes) == volumes
+    assert select_volumes(volumes, since="2024-03-01") == volumes[1:2]
+    assert select_volumes(volumes, reporter="cal") == volumes[2:]
+    assert select_volumes(volumes, volume_list=["a2d/1", "cal/1 "]) == [volumes[0], volumes[2]]
+    assert select_volumes(volumes, since="2023-12-31T00:00:00+00:00", reporter="a2d", volume_list=["a2d/2"]) == [
+        volumes[1]
+    ]
@@ -0,0 +1,303 @@
+import io
+import json
+import os
+import zipfile
+from unittest.mock import patch
+
+import pytest
+from botocore.exceptions import ClientError
+
+from tasks.helpers import (
+    get_zip_entries,
+    get_zip_member,
+    get_cached_object,
+    download_object,
+    read_object,
+    MultipartUploadWriter,
+    ZipStreamWriter,
+    compress_zip_entry,
+    create_zip_index,
+    get_zip_index,
+    get_zip_index_key,
+    read_indexed_zip_member,
+    list_objects,
+    list_objects_sharded,
+    get_volumes_metadata,
+    get_reporter_volumes_metadata,
+    put_encoded_object,
+    encode_body,
+    decode_body,
+    R2_STATIC_BUCKET,
+)
+
+
+TEST_ZIP_PATH = os.path.join(os.path.dirname(__file__), "test_data", "a2d", "100.zip")
+
+
+def test_get_zip_member_matches_zipfile(s3_client):
+    with zipfile.ZipFile(TEST_ZIP_PATH) as zip_ref:
+        expected = zip_ref.read("metadata/CasesMetadata.json")
+
+    with patch.object(s3_client, "get_object", wraps=s3_client.get_object) as mock_get_object:
+        content = get_zip_member(R2_STATIC_BUCKET, "a2d/100.zip", "CasesMetadata.json", s3_client)
+
+    assert content == expected
+    # one request for the end of the archive, one for the member
+    assert mock_get_object.call_count == 2
+    assert all("Range" in call.kwargs for call in mock_get_object.call_args_list)
+
+
+def test_get_zip_member_not_found(s3_client):
+    assert get_zip_member(R2_STATIC_BUCKET, "a2d/100.zip", "missing.json", s3_client) is None
+
+
+def test_get_zip_entries_large_comment_and_stored_files(s3_client):
+    # a comment pushes the central directory out of the first range request
+    bytes_io = io.BytesIO()
+    with zipfile.ZipFile(bytes_io, "w") as zip_file:
+        zip_file.writestr("json/0001-01.json", b"x" * 100_000, compress_type=zipfile.ZIP_STORED)
+        zip_file.writestr("html/0001-01.html", b"<p>case</p>" * 1000, compress_type=zipfile.ZIP_DEFLATED)
+        zip_file.comment = b"c" * 0xFFFF
+    s3_client.put_object(Bucket=R2_STATIC_BUCKET, Key="test/1.zip", Body=bytes_io.getvalue())
+
+    entries = get_zip_entries(R2_STATIC_BUCKET, "test/1.zip", s3_client)
+
+    assert [entry["name"] for entry in entries] == ["json/0001-01.json", "html/0001-01.html"]
+    assert get_zip_member(R2_STATIC_BUCKET, "test/1.zip", ".json", s3_client) == b"x" * 100_000
+    assert get_zip_member(R2_STATIC_BUCKET, "test/1.zip", ".html", s3_client) == b"<p>case</p>" * 1000
+
+
+def test_get_zip_member_missing_archive(s3_client):
+    with pytest.raises(s3_client.exceptions.NoSuchKey):
+        get_zip_member(R2_STATIC_BUCKET, "a2d/missing.zip", "CasesMetadata.json", s3_client)
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    with patch("tasks.helpers.CACHE_DIR", str(tmp_path)), patch("tasks.helpers.cache_size", None):
+        yield tmp_path
+
+
+def test_cached_object_revalidates_with_conditional_get(s3_client, cache_dir, tmp_path):
+    s3_client.put_object(Bucket=R2_STATIC_BUCKET, Key="test/1.pdf", Body=b"version 1")
+
+    with patch.object(s3_client, "get_object", wraps=s3_client.get_object) as mock_get_object:
+        first_path = get_cached_object(R2_STATIC_BUCKET, "test/1.pdf", s3_client)
+        second_path = get_cached_object(R2_STATIC_BUCKET, "test/1.pdf", s3_client)
+
+    assert first_path == second_path
+    assert "IfNoneMatch" not in mock_get_object.call_args_list[0].kwargs
+    assert "IfNoneMatch" in mock_get_object.call_args_list[1].kwargs
+
+    s3_client.put_object(Bucket=R2_STATIC_BUCKET, Key="test/1.pdf", Body=b"version 2")
+    assert read_object(R2_STATIC_BUCKET, "test/1.pdf", s3_client) == b"version 2"
+    # the stale version is dropped
+    assert not os.path.exists(first_path)
+
+    download_object(R2_STATIC_BUCKET, "test/1.pdf", str(tmp_path / "1.pdf"), s3_client)
+    assert (tmp_path / "1.pdf").read_bytes() == b"version 2"
+
+
+def test_cache_evicts_least_recently_used(s3_client, cache_dir):
+    for number in range(3):
+        s3_client.put_object(Bucket=R2_STATIC_BUCKET, Key=f"test/{number}.json", Body=b"x" * 100)
+
+    with patch("tasks.helpers.CACHE_MAX_BYTES", 250):
+        paths = [get_cached_object(R2_STATIC_BUCKET, f"test/{number}.json", s3_client) for number in range(2)]
+        os.utime(paths[1], (0, 0))
+        os.utime(paths[0], (1, 1))
+        get_cached_object(R2_STATIC_BUCKET, "test/2.json", s3_client)
+
+    assert os.path.exists(paths[0])
+    assert not os.path.exists(paths[1])
+
+
+def test_get_zip_member_cached(s3_client, cache_dir):
+    first = get_zip_member(R2_STATIC_BUCKET, "a2d/100.zip", "CasesMetadata.json", s3_client)
+
+    with patch.object(s3_client, "get_object", wraps=s3_client.get_object) as mock_get_object:
+        second = get_zip_member(R2_STATIC_BUCKET, "a2d/100.zip", "CasesMetadata.json", s3_client)
+
+    assert first == second
+    mock_get_object.assert_not_called()
+
+    with pytest.raises(s3_client.exceptions.NoSuchKey):
+        get_zip_member(R2_STATIC_BUCKET, "a2d/missing.zip", "CasesMetadata.json", s3_client)
+
+
+def test_multipart_upload_writer_streams_parts(s3_client):
+    data = os.urandom(11 * 1024 * 1024)
+    part_size = 5 * 1024 * 1024
+
+    with patch.object(s3_client, "upload_part", wraps=s3_client.upload_part) as mock_upload_part:
+        with MultipartUploadWriter(R2_STATIC_BUCKET, "test/1.zip", s3_client, part_size=part_size) as writer:
+            for start in range(0, len(data), 1024 * 1024):
+                writer.write(data[start:start + 1024 * 1024])
+            assert writer.tell() == len(data)
+
+    assert mock_upload_part.call_count == 3
+    uploaded = s3_client.get_object(Bucket=R2_STATIC_BUCKET, Key="test/1.zip")
+    assert uploaded["Body"].read() == data
+
+    # writing the same bytes again leaves the object alone, without uploading any part
+    with (
+        patch.object(s3_client, "create_multipart_upload") as mock_create_multipart_upload,
+        MultipartUploadWriter(R2_STATIC_BUCKET, "test/1.zip", s3_client, part_size=part_size,
+                              skip_if_etag=uploaded["ETag"]) as writer,
+    ):
+        writer.write(data)
+    assert writer.skipped
+    mock_create_multipart_upload.assert_not_called()
+
+    # spooled parts are uploaded once the ETag turns out to differ
+    changed = os.urandom(len(data))
+    with patch.object(s3_client, "upload_part", wraps=s3_client.upload_part) as mock_upload_part:
+        with MultipartUploadWriter(R2_STATIC_BUCKET, "test/1.zip", s3_client, part_size=part_size,
+                                   skip_if_etag=uploaded["ETag"]) as writer:
+            writer.write(changed)
+            mock_upload_part.assert_not_called()
+    assert not writer.skipped
+    assert mock_upload_part.call_count == 3
+    assert s3_client.get_object(Bucket=R2_STATIC_BUCKET, Key="test/1.zip")["Body"].read() == changed
+    assert not s3_client.list_multipart_uploads(Bucket=R2_STATIC_BUCKET).get("Uploads")
+
+
+def test_multipart_upload_writer_small_object_and_abort(s3_client):
+    with MultipartUploadWriter(R2_STATIC_BUCKET, "test/1.zip", s3_client) as writer:
+        writer.write(b"small")
+    assert s3_client.get_object(Bucket=R2_STATIC_BUCKET, Key="test/1.zip")["Body"].read() == b"small"
+
+    with pytest.raises(ValueError):
+        with MultipartUploadWriter(R2_STATIC_BUCKET, "test/2.zip", s3_client, part_size=5 * 1024 * 1024) as writer:
+            writer.write(os.urandom(6 * 1024 * 1024))
+            raise ValueError("fetch failed")
+
+    assert "Contents" not in s3_client.list_objects_v2(Bucket=R2_STATIC_BUCKET, Prefix="test/2.zip")
+    assert not s3_client.list_multipart_uploads(Bucket=R2_STATIC_BUCKET).get("Uploads")
+
+
+def test_zip_stream_writer_readable_by_zipfile(s3_client):
+    files = {
+        "json/0001-01.json": b'{"name": "case"}' * 100,
+        "html/0001-01.html": b"<",
+        "metadata/Vólume.json": b"{}",
+    }
+
+    bytes_io = io.BytesIO()
+    with ZipStreamWriter(bytes_io) as zip_file:
+        for name, content in files.items():
+            zip_file.add_entry(compress_zip_entry(name, content, (2024, 3, 4, 14, 51, 10)))
+
+    with zipfile.ZipFile(bytes_io) as zip_ref:
+        assert zip_ref.testzip() is None
+        assert {info.filename: zip_ref.read(info) for info in zip_ref.infolist()} == files
+        assert zip_ref.getinfo("json/0001-01.json").compress_type == zipfile.ZIP_DEFLATED
+        assert zip_ref.getinfo("html/0001-01.html").compress_type == zipfile.ZIP_STORED
+        assert zip_ref.getinfo("json/0001-01.json").date_time == (2024, 3, 4, 14, 51, 10)
+
+    s3_client.put_object(Bucket=R2_STATIC_BUCKET, Key="test/1.zip", Body=bytes_io.getvalue())
+    assert get_zip_member(R2_STATIC_BUCKET, "test/1.zip", "Vólume.json", s3_client) == b"{}"
+
+
+def test_zip_stream_writer_zip64_entry_count(s3_client):
+    entry_count = 0xFFFF + 1
+    bytes_io = io.BytesIO()
+    with ZipStreamWriter(bytes_io) as zip_file:
+        for number in range(entry_count):
+            zip_file.add_entry(compress_zip_entry(f"{number}.json", b"", (2024, 1, 1, 0, 0, 0)))
+
+    with zipfile.ZipFile(bytes_io) as zip_ref:
+        assert len(zip_ref.infolist()) == entry_count
+
+    s3_client.put_object(Bucket=R2_STATIC_BUCKET, Key="test/1.zip", Body=bytes_io.getvalue())
+    assert len(get_zip_entries(R2_STATIC_BUCKET, "test/1.zip", s3_client)) == entry_count
+
+
+def test_read_indexed_zip_member_single_range_request(s3_client):
+    files = {"json/0001-01.json": b'{"name": "case"}' * 100, "html/0001-01.html": b"", "metadata/Vólume.json": b"{}"}
+
+    with MultipartUploadWriter(R2_STATIC_BUCKET, "test/1.zip", s3_client) as upload:
+        with ZipStreamWriter(upload) as zip_file:
+            for name, content in files.items():
+                zip_file.add_entry(compress_zip_entry(name, content, (1980, 1, 1, 0, 0, 0)))
+    zip_index = create_zip_index(zip_file.entries, upload.etag, upload.tell())
+    s3_client.put_object(Bucket=R2_STATIC_BUCKET, Key=get_zip_index_key("test/1.zip"), Body=json.dumps(zip_index))
+
+    assert get_zip_index(R2_STATIC_BUCKET, "test/1.zip", s3_client) == zip_index
+    with patch.object(s3_client, "get_object", wraps=s3_client.get_object) as mock_get_object:
+        for name, content in files.items():
+            assert read_indexed_zip_member(R2_STATIC_BUCKET, "test/1.zip", name, zip_index, s3_client) == content
+        assert read_indexed_zip_member(R2_STATIC_BUCKET, "test/1.zip", "json/missing.json", zip_index,
+                                       s3_client) is None
+    # the empty file needs no request at all
+    assert mock_get_object.call_count == 2
+
+    # a replaced zip doesn't match its old index
+    s3_client.put_object(Bucket=R2_STATIC_BUCKET, Key="test/1.zip", Body=b"replaced")
+    with pytest.raises(ClientError):
+        read_indexed_zip_member(R2_STATIC_BUCKET, "test/1.zip", "metadata/Vólume.json", zip_index, s3_client)
+
+
+def test_read_indexed_zip_member_without_index(s3_client):
+    assert get_zip_index(R2_STATIC_BUCKET, "a2d/100.zip", s3_client) is None
+    with zipfile.ZipFile(TEST_ZIP_PATH) as zip_ref:
+        expected = zip_ref.read("metadata/CasesMetadata.json")
+
+    assert read_indexed_zip_member(R2_STATIC_BUCKET, "a2d/100.zip", "metadata/CasesMetadata.json",
+                                   s3_client=s3_client) == expected
+    assert read_indexed_zip_member(R2_STATIC_BUCKET, "a2d/100.zip", "CasesMetadata.json", s3_client=s3_client) is None
+
+
+def test_list_objects_sharded_matches_listing(s3_client):
+    for key in ["a2d/100/cases/0036-01.json", "a2d/100/html/0036-01.html", "a2d/100.zip", "a2d/101/cases/0001-01.json",
+                "cal/1/VolumeMetadata.json", "ReportersMetadata.json"]:
+        s3_client.put_object(Bucket=R2_STATIC_BUCKET, Key=key, Body=b"{}")
+
+    for prefix in ["", "a2d/", "a2d/100/", "missing/"]:
+        expected = [item["Key"] for item in list_objects(R2_STATIC_BUCKET, prefix, s3_client=s3_client)]
+        for shard_depth in range(4):
+            keys = [item["Key"] for item in list_objects_sharded(R2_STATIC_BUCKET, prefix, s3_client, shard_depth)]
+            assert sorted(keys) == expected
+
+    assert (sorted(item["Key"] for item in list_objects(R2_STATIC_BUCKET, "a2d/", s3_client=s3_client, shard_depth=2))
+            == [item["Key"] for item in list_objects(R2_STATIC_BUCKET, "a2d/", s3_client=s3_client)])
+
+
+@pytest.mark.parametrize("cached", [False, True])
+def test_encoded_metadata_is_read_decoded(s3_client, tmp_path, cached):
+    body = json.dumps([{"reporter_slug": "a2d", "volume_folder": "1"}] * 100).encode("utf-8")
+    put_encoded_object(R2_STATIC_BUCKET, "VolumesMetadata.json", body, "application/json", "gzip", s3_client)
+    put_encoded_object(R2_STATIC_BUCKET, "a2d/VolumesMetadata.json", body, "application/json", "gzip", s3_client)
+
+    response = s3_client.get_object(Bucket=R2_STATIC_BUCKET, Key="VolumesMetadata.json")
+    assert response["ContentEncoding"] == "gzip" and response["ContentType"] == "application/json"
+    assert len(response["Body"].read()) < len(body)
+    with (
+        patch("tasks.helpers.r2_s3_client", s3_client),
+        patch("tasks.helpers.CACHE_DIR", str(tmp_path) if cached else None),
+        patch("tasks.helpers.cache_size", None),
+    ):
+        assert get_volumes_metadata(R2_STATIC_BUCKET) == body.decode("utf-8")
+        assert get_reporter_volumes_metadata(R2_STATIC_BUCKET, "a2d") == body.decode("utf-8")
+
+
+def test_encode_body():
+    body = b"<table></table>" * 100
+
+    # the same body always compresses to the same bytes, so unchanged pages keep their ETag
+    assert encode_body(body, "gzip") == encode_body(body, "gzip")
+    assert encode_body(body) is body
+    with pytest.raises(ValueError):
+        encode_body(body, "deflate")
+
+
+@pytest.mark.parametrize("cached", [False, True])
+def test_read_object_passes_other_encodings_through(s3_client, tmp_path, cached):
+    s3_client.put_object(Bucket=R2_STATIC_BUCKET, Key="a2d/identity.json", Body=b"{}", ContentEncoding="identity")
+
+    with (
+        patch("tasks.helpers.CACHE_DIR", str(tmp_path) if cached else None),
+        patch("tasks.helpers.cache_size", None),
+    ):
+        assert read_object(R2_STATIC_BUCKET, "a2d/identity.json", s3_client) == b"{}"
+    assert decode_body(b"{}", "aws-chunked") == b"{}"
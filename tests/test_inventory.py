@@ -0,0 +1,64 @@
+from unittest.mock import patch
+
+import pytest
+from invoke.context import MockContext
+
+from tasks.helpers import list_objects, get_inventory_age, R2_STATIC_BUCKET
+from tasks.inventory import snapshot
+
+
+@pytest.fixture
+def inventory_dir(s3_client, tmp_path):
+    with (
+        patch("tasks.helpers.INVENTORY_DIR", str(tmp_path)),
+        patch("tasks.inventory.INVENTORY_DIR", str(tmp_path)),
+        patch("tasks.inventory.r2_s3_client", s3_client),
+    ):
+        yield tmp_path
+
+
+def list_bucket(s3_client, prefix="", **list_kwargs):
+    return [{field: item[field] for field in ["Key", "Size", "ETag", "LastModified"]}
+            for page in s3_client.get_paginator("list_objects_v2").paginate(
+                Bucket=R2_STATIC_BUCKET, Prefix=prefix, **list_kwargs)
+            for item in page.get("Contents", [])]
+
+
+def test_snapshot_matches_listing(s3_client, inventory_dir, capsys):
+    s3_client.put_object(Bucket=R2_STATIC_BUCKET, Key="a2d/100/html/0036-01.html", Body=b"<p>case</p>")
+    s3_client.put_object(Bucket=R2_STATIC_BUCKET, Key="a2d/100/VolumeMetadata.json", Body=b"{}")
+    s3_client.put_object(Bucket=R2_STATIC_BUCKET, Key="a2d/1000.pdf", Body=b"%PDF")
+    s3_client.put_object(Bucket=R2_STATIC_BUCKET, Key="ReportersMetadata.json", Body=b"[]")
+
+    snapshot(MockContext(), R2_STATIC_BUCKET)
+    assert f"{len(list_bucket(s3_client))} objects" in capsys.readouterr().out
+
+    prefixes = ["", "a2d/", "a2d/100/", "a2d/100", "missing/"]
+    expected = [list_bucket(s3_client, prefix) for prefix in prefixes]
+    expected_delimited = list_bucket(s3_client, "a2d/100/", Delimiter="/")
+
+    with patch.object(s3_client, "get_paginator") as mock_get_paginator:
+        assert [list(list_objects(R2_STATIC_BUCKET, prefix, s3_client=s3_client, use_inventory=True))
+                for prefix in prefixes] == expected
+        assert list(list_objects(R2_STATIC_BUCKET, "a2d/100/", "/", s3_client, use_inventory=True)) == expected_delimited
+    mock_get_paginator.assert_not_called()
+
+
+def test_snapshot_freshness(s3_client, inventory_dir, capsys):
+    assert get_inventory_age(R2_STATIC_BUCKET) is None
+    snapshot(MockContext(), R2_STATIC_BUCKET)
+    s3_client.put_object(Bucket=R2_STATIC_BUCKET, Key="a2d/101.pdf", Body=b"%PDF")
+
+    # a fresh snapshot is kept unless forced
+    snapshot(MockContext(), R2_STATIC_BUCKET)
+    assert "use --force to refresh it" in capsys.readouterr().out
+    assert not list(list_objects(R2_STATIC_BUCKET, "a2d/101.pdf", s3_client=s3_client, use_inventory=True))
+    # the snapshot is only read by callers that opt in
+    assert list(list_objects(R2_STATIC_BUCKET, "a2d/101.pdf", s3_client=s3_client))
+
+    # a stale snapshot is ignored
+    with patch("tasks.helpers.INVENTORY_MAX_AGE", -1):
+        assert list(list_objects(R2_STATIC_BUCKET, "a2d/101.pdf", s3_client=s3_client, use_inventory=True))
+
+    snapshot(MockContext(), R2_STATIC_BUCKET, force=True)
+    assert list(list_objects(R2_STATIC_BUCKET, "a2d/101.pdf", s3_client=s3_client, use_inventory=True))
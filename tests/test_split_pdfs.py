@@ -8,8 +8,24 @@ import json
 import os
 import io
 import zipfile
+import threading
 
-from tasks.split_pdfs import split_pdfs
+from pypdf import PdfReader, PdfWriter
+
+from tasks.split_pdfs import (
+    split_pdfs,
+    process_volumes,
+    split_pdf,
+    upload_case_pdfs,
+    get_split_manifest,
+    get_manifest_key,
+    get_volumes_to_process,
+    summarize_case_sources,
+    schedule_volumes,
+    estimate_makespan,
+    get_volume_fingerprint,
+    ByteBudget,
+)
 from tasks.helpers import R2_STATIC_BUCKET, R2_SPLIT_PDFS_BUCKET
 
 
@@ -137,6 +153,261 @@ def test_split_pdfs(mock_get_volumes_to_process, mock_get_volumes_metadata, s3_c
     print("\nTest completed successfully")
 
 
+def make_test_volume(s3_client, reporter="test", volume_folder="1", page_count=6, sources=None):
+    """
+    Uploads a blank volume PDF and its CasesMetadata.json, with one two-page case per source
+    """
+    sources = sources or ["Harvard", "Fastcase", "Harvard"]
+    writer = PdfWriter()
+    for _ in range(page_count):
+        writer.add_blank_page(width=72, height=72)
+    pdf = io.BytesIO()
+    writer.write(pdf)
+
+    cases_metadata = [
+        {
+            "file_name": f"000{index + 1}-01",
+            "first_page_order": index * 2 + 1,
+            "last_page_order": index * 2 + 2,
+            "provenance": {"source": source},
+        }
+        for index, source in enumerate(sources)
+    ]
+    s3_client.put_object(Bucket=R2_STATIC_BUCKET, Key=f"{reporter}/{volume_folder}.pdf", Body=pdf.getvalue())
+    s3_client.put_object(
+        Bucket=R2_STATIC_BUCKET,
+        Key=f"{reporter}/{volume_folder}/CasesMetadata.json",
+        Body=json.dumps(cases_metadata),
+    )
+    return {"reporter_slug": reporter, "volume_folder": volume_folder}
+
+
+def list_case_pdfs(s3_client):
+    objects = s3_client.list_objects_v2(Bucket=R2_SPLIT_PDFS_BUCKET)
+    return sorted(obj["Key"] for obj in objects.get("Contents", []) if "/case-pdfs/" in obj["Key"])
+
+
+def test_process_volumes_pipeline(s3_client):
+    volumes = [
+        make_test_volume(s3_client, volume_folder="1"),
+        make_test_volume(s3_client, volume_folder="2", sources=["Fastcase"]),
+        make_test_volume(s3_client, volume_folder="3"),
+        {"reporter_slug": "test", "volume_folder": "missing"},
+    ]
+
+    results = process_volumes(volumes, s3_client, download_workers=2, split_workers=2, upload_workers=2,
+                              queue_size=1)
+
+    assert len(results) == 4
+    assert sorted(r for r in results if r) == ["Processed 2 cases for volume 1", "Processed 2 cases for volume 3"]
+    assert list_case_pdfs(s3_client) == [
+        "test/1/case-pdfs/0001-01.pdf",
+        "test/1/case-pdfs/0003-01.pdf",
+        "test/3/case-pdfs/0001-01.pdf",
+        "test/3/case-pdfs/0003-01.pdf",
+    ]
+    case_pdf = s3_client.get_object(Bucket=R2_SPLIT_PDFS_BUCKET, Key="test/1/case-pdfs/0003-01.pdf")
+    assert len(PdfReader(io.BytesIO(case_pdf["Body"].read())).pages) == 2
+
+
+def test_split_pdf_in_memory_and_spilled(s3_client, tmp_path):
+    volume = make_test_volume(s3_client)
+    pdf_path = tmp_path / "1.pdf"
+    pdf_path.write_bytes(s3_client.get_object(Bucket=R2_STATIC_BUCKET, Key="test/1.pdf")["Body"].read())
+    cases_metadata = json.loads(
+        s3_client.get_object(Bucket=R2_STATIC_BUCKET, Key="test/1/CasesMetadata.json")["Body"].read()
+    )
+
+    in_memory = split_pdf(str(pdf_path), cases_metadata)
+    spilled = split_pdf(str(pdf_path), cases_metadata, spill_threshold=1)
+
+    assert [type(case_pdf) for _, case_pdf in in_memory] == [bytes, bytes]
+    assert all(os.path.exists(case_pdf) for _, case_pdf in spilled)
+
+    upload_case_pdfs(spilled, volume, s3_client)
+
+    assert not any(os.path.exists(case_pdf) for _, case_pdf in spilled)
+    uploaded = s3_client.get_object(Bucket=R2_SPLIT_PDFS_BUCKET, Key="test/1/case-pdfs/0001-01.pdf")
+    assert uploaded["Body"].read() == in_memory[0][1]
+
+
+def test_process_volumes_resumes_from_manifest(s3_client):
+    volume = make_test_volume(s3_client)
+    process_volumes([volume], s3_client, split_workers=1)
+
+    manifest = get_split_manifest(volume, s3_client)
+    assert manifest["complete"]
+    assert [case["file_name"] for case in manifest["cases"]] == ["0001-01", "0003-01"]
+    assert all(case["size"] and case["etag"] for case in manifest["cases"])
+
+    # a finished volume is skipped without downloading its PDF
+    with patch("tasks.split_pdfs.download_pdf") as mock_download_pdf:
+        assert process_volumes([volume], s3_client, split_workers=1) == [None]
+    mock_download_pdf.assert_not_called()
+
+    # an interrupted run only uploads the cases its manifest doesn't list
+    manifest["complete"] = False
+    manifest["cases"] = manifest["cases"][:1]
+    s3_client.put_object(Bucket=R2_SPLIT_PDFS_BUCKET, Key=get_manifest_key(volume), Body=json.dumps(manifest))
+    s3_client.delete_object(Bucket=R2_SPLIT_PDFS_BUCKET, Key="test/1/case-pdfs/0003-01.pdf")
+
+    assert process_volumes([volume], s3_client, split_workers=1) == ["Processed 1 cases for volume 1"]
+    assert list_case_pdfs(s3_client) == ["test/1/case-pdfs/0001-01.pdf", "test/1/case-pdfs/0003-01.pdf"]
+    assert get_split_manifest(volume, s3_client)["complete"]
+
+    # a changed source PDF is split again
+    make_test_volume(s3_client, page_count=8)
+    assert process_volumes([volume], s3_client, split_workers=1) == ["Processed 2 cases for volume 1"]
+
+
+def test_process_volumes_does_not_count_case_pdfs_of_other_inputs(s3_client):
+    volume = make_test_volume(s3_client)
+    process_volumes([volume], s3_client, split_workers=1)
+
+    # the source changed, and one upload fails while a case PDF of the old source is still there
+    make_test_volume(s3_client, page_count=8)
+    put_object = s3_client.put_object
+
+    def failing_put_object(**kwargs):
+        if kwargs["Key"] == "test/1/case-pdfs/0003-01.pdf":
+            raise OSError("connection reset")
+        return put_object(**kwargs)
+
+    with patch.object(s3_client, "put_object", side_effect=failing_put_object):
+        results = process_volumes([volume], s3_client, split_workers=1)
+
+    assert results == ["Error processing volume 1: 1 case PDFs missing"]
+    # the old case PDF stays published until it is overwritten, but the manifest only lists this run's upload
+    assert list_case_pdfs(s3_client) == ["test/1/case-pdfs/0001-01.pdf", "test/1/case-pdfs/0003-01.pdf"]
+    manifest = get_split_manifest(volume, s3_client)
+    assert not manifest["complete"]
+    assert [case["file_name"] for case in manifest["cases"]] == ["0001-01"]
+
+    # the resume splits the missing case again rather than keeping the old one
+    assert process_volumes([volume], s3_client, split_workers=1) == ["Processed 1 cases for volume 1"]
+    manifest = get_split_manifest(volume, s3_client)
+    assert manifest["complete"]
+    case_pdf = s3_client.head_object(Bucket=R2_SPLIT_PDFS_BUCKET, Key="test/1/case-pdfs/0003-01.pdf")
+    assert manifest["cases"][1]["etag"] == case_pdf["ETag"]
+
+
+def test_process_volumes_keeps_case_pdfs_when_a_new_split_fails(s3_client):
+    volume = make_test_volume(s3_client)
+    process_volumes([volume], s3_client, split_workers=1)
+    # as if the case PDFs were split before manifests were written
+    s3_client.delete_object(Bucket=R2_SPLIT_PDFS_BUCKET, Key=get_manifest_key(volume))
+
+    with patch("tasks.split_pdfs.download_pdf", side_effect=OSError("connection reset")):
+        results = process_volumes([volume], s3_client, split_workers=1)
+
+    assert results == ["Error processing volume 1: connection reset"]
+    assert list_case_pdfs(s3_client) == ["test/1/case-pdfs/0001-01.pdf", "test/1/case-pdfs/0003-01.pdf"]
+    assert get_split_manifest(volume, s3_client)["cases"] == []
+
+
+@patch("tasks.split_pdfs.get_case_sources_metadata")
+@patch("tasks.split_pdfs.get_volumes_metadata")
+def test_summarize_case_sources_skips_fastcase_only_volumes(
+    mock_get_volumes_metadata, mock_get_case_sources_metadata, s3_client
+):
+    volumes = [
+        make_test_volume(s3_client, volume_folder="1"),
+        make_test_volume(s3_client, volume_folder="2", sources=["Fastcase", "Fastcase"]),
+    ]
+    mock_get_volumes_metadata.return_value = json.dumps(volumes)
+    mock_get_case_sources_metadata.return_value = None
+
+    summarize_case_sources(MockContext(), s3_client=s3_client)
+
+    case_sources_metadata = s3_client.get_object(Bucket=R2_STATIC_BUCKET, Key="CaseSourcesMetadata.json")
+    summaries = json.loads(case_sources_metadata["Body"].read())
+    assert sorted(summaries, key=lambda summary: summary["volume_folder"]) == [
+        {"reporter_slug": "test", "volume_folder": "1", "case_sources": {"Harvard": 2, "Fastcase": 1},
+         "fastcase_only": False},
+        {"reporter_slug": "test", "volume_folder": "2", "case_sources": {"Fastcase": 2}, "fastcase_only": True},
+    ]
+
+    mock_get_case_sources_metadata.return_value = json.dumps(summaries)
+    assert get_volumes_to_process(reporter="test") == [volumes[0]]
+
+
+def test_schedule_volumes_largest_first(s3_client, capsys):
+    volumes = [
+        make_test_volume(s3_client, volume_folder="1", page_count=6),
+        make_test_volume(s3_client, volume_folder="2", page_count=40),
+        make_test_volume(s3_client, volume_folder="3", page_count=20),
+    ]
+
+    scheduled = schedule_volumes(volumes, 2, s3_client)
+
+    assert [v["volume_folder"] for v in scheduled] == ["2", "3", "1"]
+    assert all(v["pdf_size"] > 0 and v["pdf_etag"] for v in scheduled)
+    assert "Expected makespan for 2 workers" in capsys.readouterr().out
+
+    # the listed ETag is used instead of a HEAD request
+    with patch.object(s3_client, "head_object") as mock_head_object:
+        fingerprint = get_volume_fingerprint(scheduled[0], [], s3_client)
+    mock_head_object.assert_not_called()
+    assert fingerprint["source_pdf_etag"] == scheduled[0]["pdf_etag"]
+
+
+def test_estimate_makespan():
+    assert estimate_makespan([1, 1, 1, 1, 4], 2) == 6
+    assert estimate_makespan([4, 1, 1, 1, 1], 2) == 4
+
+
+def test_byte_budget_holds_back_until_released():
+    budget = ByteBudget(100)
+    budget.acquire(60)
+    # a volume larger than the whole budget is still admitted when nothing else is held
+    admitted = threading.Event()
+    thread = threading.Thread(target=lambda: (budget.acquire(150), admitted.set()))
+    thread.start()
+
+    assert not admitted.wait(0.1)
+    budget.release(60)
+    assert admitted.wait(1)
+    thread.join()
+    assert budget.in_flight == 150
+    assert budget.peak == 150
+
+
+def test_skipped_volumes_do_not_wait_for_disk(s3_client):
+    volume = make_test_volume(s3_client)
+    process_volumes([volume], s3_client, split_workers=1)
+
+    def held_budget(limit=0):
+        # as if other volumes' PDFs took up the whole disk budget
+        budget = ByteBudget(limit)
+        budget.add(limit)
+        return budget
+
+    results = []
+    with patch("tasks.split_pdfs.ByteBudget", side_effect=held_budget):
+        thread = threading.Thread(target=lambda: results.extend(process_volumes(
+            [{**volume, "pdf_size": 50}], s3_client, split_workers=1, disk_budget=100,
+        )), daemon=True)
+        thread.start()
+        thread.join(timeout=10)
+
+    # the finished volume is skipped without waiting for room it doesn't need
+    assert not thread.is_alive()
+    assert results == [None]
+
+
+def test_process_volumes_within_disk_budget(s3_client, capsys):
+    volumes = schedule_volumes(
+        [make_test_volume(s3_client, volume_folder=str(folder)) for folder in range(1, 4)], 1, s3_client
+    )
+    pdf_size = volumes[0]["pdf_size"]
+
+    results = process_volumes(volumes, s3_client, download_workers=3, split_workers=1, disk_budget=pdf_size,
+                              memory_budget=pdf_size)
+
+    assert sorted(results) == [f"Processed 2 cases for volume {folder}" for folder in range(1, 4)]
+    assert f"Peak disk use: {pdf_size / 1e6:.1f} MB" in capsys.readouterr().out
+
+
 if __name__ == "__main__":
     import sys
     import os
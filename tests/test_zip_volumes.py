@@ -1,2 +1,180 @@
+import concurrent.futures
+import io
+import json
+import os
+import threading
+import time
+import zipfile
+from unittest.mock import patch
+
+import pytest
+from invoke.context import MockContext
+
+from tasks.helpers import get_zip_index, read_indexed_zip_member, create_inventory, R2_STATIC_BUCKET
+from tasks.zip_volumes import zip_volumes, zip_volume, fetch_and_write_to_zip
+
+
+TEST_ZIP_PATH = os.path.join(os.path.dirname(__file__), "test_data", "a2d", "100.zip")
+
+
 def test_todo():
     assert True
+
+
+@pytest.fixture
+def volume_sources(s3_client):
+    """
+    Uploads the unzipped files of the a2d/100 test volume, as zip_volumes expects to find them
+    Returns the archive member names and contents
+    """
+    folders = {"json": "cases", "html": "html", "metadata": ""}
+    members = {}
+
+    with zipfile.ZipFile(TEST_ZIP_PATH) as zip_ref:
+        for name in zip_ref.namelist():
+            folder, file_name = name.split("/")
+            key = "/".join(part for part in ["a2d/100", folders[folder], file_name] if part)
+            members[name] = zip_ref.read(name)
+            s3_client.put_object(Bucket=R2_STATIC_BUCKET, Key=key, Body=members[name])
+
+    with (
+        patch("tasks.zip_volumes.r2_s3_client", s3_client),
+        patch("tasks.zip_volumes.get_volumes_metadata") as mock_get_volumes_metadata,
+    ):
+        mock_get_volumes_metadata.return_value = json.dumps([{"reporter_slug": "a2d", "volume_folder": "100"}])
+        yield members
+
+
+def read_volume_zip(s3_client, key="a2d/100.zip"):
+    body = s3_client.get_object(Bucket=R2_STATIC_BUCKET, Key=key)["Body"].read()
+    with zipfile.ZipFile(io.BytesIO(body)) as zip_ref:
+        assert zip_ref.testzip() is None
+        return {name: zip_ref.read(name) for name in zip_ref.namelist()}
+
+
+def test_zip_volumes(s3_client, volume_sources):
+    zip_volumes(MockContext(), R2_STATIC_BUCKET)
+
+    assert read_volume_zip(s3_client) == volume_sources
+
+    zip_index = get_zip_index(R2_STATIC_BUCKET, "a2d/100.zip", s3_client)
+    assert zip_index["etag"] == s3_client.head_object(Bucket=R2_STATIC_BUCKET, Key="a2d/100.zip")["ETag"]
+    assert set(zip_index["members"]) == set(volume_sources)
+    for name, content in volume_sources.items():
+        assert read_indexed_zip_member(R2_STATIC_BUCKET, "a2d/100.zip", name, zip_index, s3_client) == content
+
+
+def test_zip_volumes_in_parallel(s3_client, volume_sources, capsys):
+    for item in s3_client.list_objects_v2(Bucket=R2_STATIC_BUCKET, Prefix="a2d/100/")["Contents"]:
+        s3_client.copy_object(Bucket=R2_STATIC_BUCKET, Key=item["Key"].replace("a2d/100/", "a2d/101/"),
+                              CopySource={"Bucket": R2_STATIC_BUCKET, "Key": item["Key"]})
+    volumes = [{"reporter_slug": "a2d", "volume_folder": folder} for folder in ["100", "101"]]
+
+    with patch("tasks.zip_volumes.get_volumes_metadata", return_value=json.dumps(volumes)):
+        zip_volumes(MockContext(), R2_STATIC_BUCKET, volumes_in_flight=2, fetch_workers=4)
+
+    assert read_volume_zip(s3_client, "a2d/100.zip") == volume_sources
+    assert read_volume_zip(s3_client, "a2d/101.zip") == volume_sources
+    assert "2/2 were processed" in capsys.readouterr().out
+
+
+def test_zip_volumes_failed_fetch_publishes_nothing(s3_client, volume_sources, capsys):
+    zip_volumes(MockContext(), R2_STATIC_BUCKET)
+    existing_zip = s3_client.head_object(Bucket=R2_STATIC_BUCKET, Key="a2d/100.zip")
+    existing_index = s3_client.head_object(Bucket=R2_STATIC_BUCKET, Key="a2d/100.zip.index.json")
+    s3_client.put_object(Bucket=R2_STATIC_BUCKET, Key="a2d/100/html/0001-01.html", Body=b"edited")
+    failing_key = sorted(item["Key"] for item in s3_client.list_objects_v2(
+        Bucket=R2_STATIC_BUCKET, Prefix="a2d/100/cases/")["Contents"])[0]
+
+    def read_object(bucket, key, s3_client):
+        if key == failing_key:
+            raise OSError("connection reset")
+        return s3_client.get_object(Bucket=bucket, Key=key)["Body"].read()
+
+    with patch("tasks.zip_volumes.read_object", side_effect=read_object):
+        zip_volumes(MockContext(), R2_STATIC_BUCKET, incremental=True, fetch_workers=2)
+    output = capsys.readouterr().out
+    assert "Failed to zip a2d/100.zip: connection reset" in output and "1 failed" in output
+
+    # the previous zip and index are left as they were, and no multipart upload is left open
+    assert s3_client.head_object(Bucket=R2_STATIC_BUCKET, Key="a2d/100.zip")["ETag"] == existing_zip["ETag"]
+    assert s3_client.head_object(
+        Bucket=R2_STATIC_BUCKET, Key="a2d/100.zip.index.json")["ETag"] == existing_index["ETag"]
+    assert "Uploads" not in s3_client.list_multipart_uploads(Bucket=R2_STATIC_BUCKET)
+
+    # so the next incremental run zips the volume again
+    zip_volumes(MockContext(), R2_STATIC_BUCKET, incremental=True)
+    assert read_volume_zip(s3_client)["html/0001-01.html"] == b"edited"
+
+
+def test_zip_volume_fetches_a_bounded_window_ahead(s3_client, volume_sources):
+    first_key = "a2d/100/cases/" + sorted(name for name in volume_sources if name.startswith("json/"))[0][5:]
+    first_done = threading.Event()
+    fetched_while_first_pending = []
+
+    def read_object(bucket, key, s3_client):
+        if key == first_key:
+            time.sleep(0.3)
+            first_done.set()
+        elif not first_done.is_set():
+            fetched_while_first_pending.append(key)
+        return s3_client.get_object(Bucket=bucket, Key=key)["Body"].read()
+
+    with (
+        patch("tasks.zip_volumes.read_object", side_effect=read_object),
+        concurrent.futures.ThreadPoolExecutor(max_workers=8) as fetch_executor,
+    ):
+        zip_volume("a2d", "100", R2_STATIC_BUCKET, fetch_executor, entries_ahead=3)
+
+    # a slow first GET holds back at most two later entries, however many fetch workers are free
+    assert len(fetched_while_first_pending) == 2
+    assert read_volume_zip(s3_client) == volume_sources
+
+
+def test_zip_volumes_incremental(s3_client, volume_sources):
+    zip_volumes(MockContext(), R2_STATIC_BUCKET)
+
+    with patch.object(s3_client, "put_object", wraps=s3_client.put_object) as mock_put_object:
+        zip_volumes(MockContext(), R2_STATIC_BUCKET, incremental=True)
+    mock_put_object.assert_not_called()
+
+    s3_client.put_object(Bucket=R2_STATIC_BUCKET, Key="a2d/100/html/0036-01.html", Body=b"<p>edited</p>")
+    zip_volumes(MockContext(), R2_STATIC_BUCKET, incremental=True)
+
+    assert read_volume_zip(s3_client)["html/0036-01.html"] == b"<p>edited</p>"
+
+
+def test_zip_volumes_reproducible(s3_client, volume_sources):
+    zip_volumes(MockContext(), R2_STATIC_BUCKET)
+    first = s3_client.get_object(Bucket=R2_STATIC_BUCKET, Key="a2d/100.zip")
+    s3_client.delete_object(Bucket=R2_STATIC_BUCKET, Key="a2d/100.zip")
+
+    # finish the fetches in reverse order
+    def slow_first_fetch(zip_file, file, folder, bucket, lock, index):
+        time.sleep(0.01 * (30 - index))
+        return fetch_and_write_to_zip(zip_file, file, folder, bucket, lock, index)
+
+    with patch("tasks.zip_volumes.fetch_and_write_to_zip", slow_first_fetch):
+        zip_volumes(MockContext(), R2_STATIC_BUCKET, fetch_workers=30)
+    second = s3_client.get_object(Bucket=R2_STATIC_BUCKET, Key="a2d/100.zip")
+
+    assert first["Body"].read() == second["Body"].read()
+    assert list(read_volume_zip(s3_client))[:2] == ["json/0036-01.json", "json/0038-01.json"]
+
+    # an identical zip isn't uploaded again
+    with patch.object(s3_client, "put_object", wraps=s3_client.put_object) as mock_put_object:
+        zip_volumes(MockContext(), R2_STATIC_BUCKET)
+    mock_put_object.assert_not_called()
+
+
+def test_zip_volumes_incremental_ignores_inventory_snapshot(s3_client, volume_sources, tmp_path):
+    zip_volumes(MockContext(), R2_STATIC_BUCKET)
+    name, key = "metadata/CasesMetadata.json", "a2d/100/CasesMetadata.json"
+
+    with patch("tasks.helpers.INVENTORY_DIR", str(tmp_path)):
+        create_inventory(R2_STATIC_BUCKET, s3_client)
+        # edited after the snapshot was taken
+        s3_client.put_object(Bucket=R2_STATIC_BUCKET, Key=key, Body=b"[]")
+        zip_volumes(MockContext(), R2_STATIC_BUCKET, incremental=True)
+
+    assert read_volume_zip(s3_client) == {**volume_sources, name: b"[]"}